@@ -0,0 +1 @@
+"""Benchmarks of the tgvdr parsing and EPG code, run with python -m <package>.benchmarks.<name>."""
@@ -0,0 +1,97 @@
+"""Synthetic guides for the benchmarks, or the guide of a SVDRP capture."""
+import os
+import random
+
+from ..tgpyvdr.tgpyvdr import EPG_DATA_RECORD
+from ..tgpyvdr.tgpyvdr import parse_epg_records
+from ..tgsvdrp.capture import capture_reply
+from ..tgsvdrp.tgsvdrp import greeting_encoding
+from ..tgsvdrp.tgsvdrp import split_lines
+
+# path of a capture (python -m tgvdr.tgsvdrp.capture) to run the benchmarks on
+CAPTURE_ENV = "TGVDR_CAPTURE"
+
+TITLES = (
+    "Tagesschau",
+    "Tatort",
+    "Sportschau",
+    "Wetter",
+    "Polizeiruf 110",
+    "Die Sendung mit der Maus",
+    "heute journal",
+    "Terra X",
+    "Markus Lanz",
+    "Der Bergdoktor",
+)
+WORDS = (
+    "Kommissar ermittelt in einem Fall der weit in die Vergangenheit reicht "
+    "und die Familie des Opfers schweigt über das was damals geschah während "
+    "im Präsidium der Druck wächst und eine Zeugin verschwindet"
+).split()
+
+
+def make_epg(channels=300, days=14, start=1760000000, seed=1):
+    """{channelid: {start: event}} like get_channel_epg_info, 30-120 minute events."""
+    rnd = random.Random(seed)
+    epg = {}
+    end = start + days * 86400
+    for number in range(1, channels + 1):
+        channelid = f"S19.2E-1-{1000 + number // 8}-{10000 + number}"
+        events = {"channelid": channelid, "channelname": f"Kanal {number}"}
+        at = start
+        eventid = number * 100000
+        while at < end:
+            duration = rnd.choice((1800, 2700, 3600, 5400, 7200))
+            events[str(at)] = {
+                "START": str(at),
+                "DURATION": str(duration),
+                "EVENTID": str(eventid),
+                "TITLE": rnd.choice(TITLES),
+                "SUBTITLE": f"Folge {rnd.randint(1, 500)}",
+                "DESCRIPTION": " ".join(rnd.choice(WORDS) for _ in range(60)),
+                "GENRE": rnd.choice(("10", "20", "40", "11 14")),
+            }
+            at += duration
+            eventid += 1
+        epg[channelid] = events
+    return epg
+
+
+def lste_reply(epg):
+    """The epg as raw SVDRP LSTE reply."""
+    lines = ["220 vdr SVDRP VideoDiskRecorder 2.6.1; Mon Oct 19 14:52:49 2026; UTF-8"]
+    for channelid, events in epg.items():
+        lines.append(f"215-C {channelid} {events['channelname']}")
+        for start, event in events.items():
+            if not isinstance(event, dict):
+                continue
+            lines.append(f"215-E {event['EVENTID']} {start} {event['DURATION']} 4E 1")
+            lines.append(f"215-T {event['TITLE']}")
+            lines.append(f"215-S {event['SUBTITLE']}")
+            lines.append(f"215-D {event['DESCRIPTION']}")
+            lines.append(f"215-G {event['GENRE']}")
+            lines.append("215-e")
+        lines.append("215-c")
+    lines.append("215 End of EPG data")
+    lines.append("221 vdr closing connection")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def captured_epg(path):
+    """{channelid: {start: event}} from the LSTE reply recorded in a capture."""
+    raw = capture_reply(path, "LSTE")
+    if raw is None:
+        raise ValueError(f"{path} contains no LSTE")
+    lines = split_lines(raw)
+    encoding = greeting_encoding(lines[0] if lines else None)
+    return parse_epg_records(
+        line for line in split_lines(raw, encoding) if line.code == EPG_DATA_RECORD
+    )
+
+
+def benchmark_epg(channels=300, days=14):
+    """The captured guide if $TGVDR_CAPTURE is set, a synthetic one otherwise."""
+    path = os.environ.get(CAPTURE_ENV)
+    if path:
+        return captured_epg(path)
+    return make_epg(channels=channels, days=days)
@@ -0,0 +1,80 @@
+"""Bytes on the wire and encode time: per channel json.dumps against the compact codec."""
+import json
+import time
+
+from ..tgpyvdr.epgcodec import decode_channels
+from ..tgpyvdr.epgcodec import encode_channels
+from ..tgpyvdr.epgcodec import pack
+from ..tgpyvdr.epgcodec import unpack
+from .dataset import benchmark_epg
+
+
+def payloads_of(epg):
+    """The payloads EpgStore.channel_payload builds for the guide."""
+    return {
+        channelid: {
+            "channeldata": {
+                "channelid": channelid,
+                "name": events["channelname"],
+                "lastUpdate": "10/19/2026, 14:52:49",
+            },
+            "epg": events,
+        }
+        for channelid, events in epg.items()
+    }
+
+
+def json_attributes(payloads):
+    # what the sensor does today: one JSON string per channel inside the attributes
+    attributes = {channelid: json.dumps(p) for channelid, p in payloads.items()}
+    return json.dumps(attributes)
+
+
+def compact_attributes(payloads):
+    attributes = {
+        channelid: pack(encode_channels({channelid: p}))
+        for channelid, p in payloads.items()
+    }
+    return json.dumps(attributes)
+
+
+def compact_snapshot(payloads, compress=False):
+    return pack(encode_channels(payloads), compress=compress)
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    epg = benchmark_epg(channels=300, days=14)
+    payloads = payloads_of(epg)
+    events = sum(len(e) - 2 for e in epg.values())
+    print(f"dataset: {len(epg)} channels, {events} events")
+
+    assert decode_channels(unpack(compact_snapshot(payloads, True))) == payloads
+
+    base_time, base = timed(json_attributes, payloads)
+    cases = (
+        ("json.dumps per channel (today)", json_attributes, ()),
+        ("compact per channel", compact_attributes, ()),
+        ("compact snapshot", compact_snapshot, ()),
+        ("compact snapshot, zlib", compact_snapshot, (True,)),
+    )
+    for name, func, args in cases:
+        elapsed, data = timed(func, payloads, *args)
+        size = len(data.encode())
+        print(
+            f"{name:32s} {size / 1e6:8.2f} MB  x{len(base.encode()) / size:5.1f}"
+            f"  encode {elapsed * 1000:8.1f} ms  x{base_time / elapsed:4.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Memory of the EPG store with and without shared event bodies, on simulcast channels."""
+import os
+import time
+import tracemalloc
+
+from ..tgpyvdr.epgstore import EpgStore
+from .dataset import CAPTURE_ENV
+from .dataset import benchmark_epg
+
+
+def with_simulcasts(epg, copies=2):
+    """Every channel `copies` times (HD, SD, regional), as separately parsed strings."""
+    result = {}
+    for number, (channelid, events) in enumerate(epg.items()):
+        for copy in range(copies):
+            variant = f"{channelid}-{copy}" if copy else channelid
+            channel = {"channelid": variant, "channelname": f"{events['channelname']} {copy}"}
+            for start, event in events.items():
+                if isinstance(event, dict):
+                    # fresh str objects, like a second LSTE parse would give
+                    channel[start] = {k: "".join(list(v)) for k, v in event.items()}
+            result[variant] = channel
+    return result
+
+
+def fill(epg, dedup):
+    store = EpgStore(past=None, dedup=dedup, clock=lambda: 1760000000)
+    begin = time.perf_counter()
+    for channelid, events in epg.items():
+        store.update_channel(channelid, {"channelid": channelid}, events)
+    elapsed = time.perf_counter() - begin
+    epg.clear()
+    return store, elapsed
+
+
+def main():
+    for dedup in (False, True):
+        tracemalloc.start()
+        epg = benchmark_epg(channels=150, days=14)
+        if not os.environ.get(CAPTURE_ENV):
+            # a captured guide has its own simulcasts
+            epg = with_simulcasts(epg)
+        store, elapsed = fill(epg, dedup)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = store.stats()
+        print(
+            f"dedup={dedup!s:5s} {stats['channels']} channels {stats['events']} events"
+            f"  {memory / 1e6:7.1f} MB  update {elapsed * 1000:7.1f} ms"
+        )
+        if dedup:
+            print("  ", stats["dedup"])
+            for channelid in list(store.channels):
+                store.remove_channel(channelid)
+            assert len(store.bodies) == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time window queries: columnar EpgGrid against walking the per channel dicts."""
+import time
+
+from ..tgpyvdr.epggrid import EpgGrid
+from .dataset import benchmark_epg
+
+
+def dict_walk(epg, t1, t2, channels=None):
+    result = []
+    for channelid, events in epg.items():
+        if channels is not None and channelid not in channels:
+            continue
+        for start, event in events.items():
+            if not isinstance(event, dict):
+                continue
+            begin = int(start)
+            if begin < t2 and begin + int(event["DURATION"]) > t1:
+                result.append((channelid, begin))
+    return result
+
+
+def timed(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    epg = benchmark_epg(channels=300, days=14)
+    first = min(
+        int(start) for events in epg.values() for start in events if start.isdigit()
+    )
+    # midnight of the third day of the guide
+    base = first - first % 86400 + 2 * 86400
+    build, grid = timed(EpgGrid.from_epg, epg, repeat=1)
+    print(f"dataset: {len(epg)} channels, {len(grid)} events, grid build {build:.3f}s")
+    some = set(list(epg)[:50])
+    queries = (
+        ("prime time, all channels", base + 72000, base + 82800, None),
+        ("3 hours, 50 channels", base + 54000, base + 64800, some),
+        ("now, all channels", base + 43200, base + 43201, None),
+    )
+    for name, t1, t2, channels in queries:
+        walk_time, walk = timed(dict_walk, epg, t1, t2, channels)
+        grid_time, rows = timed(grid.window, t1, t2, channels)
+        found = sorted((e["channelid"], e["START"]) for e in grid.rows(rows))
+        assert found == sorted(walk), name
+        print(
+            f"{name:28s} {len(rows[1]):6d} events  dict walk {walk_time * 1000:8.2f} ms"
+            f"  grid {grid_time * 1000:7.2f} ms  x{walk_time / grid_time:.0f}"
+        )
+    evict_update(epg)
+
+
+def evict_update(epg):
+    # what the EPG sensor does every few minutes: every channel loses its first event
+    events = {
+        channelid: {k: v for k, v in channel.items() if isinstance(v, dict)}
+        for channelid, channel in epg.items()
+    }
+    grid = EpgGrid.from_epg(events)
+    for channel in events.values():
+        del channel[min(channel, key=int)]
+    update, _ = timed(grid.update, events, repeat=1)
+    rebuild, _ = timed(EpgGrid.from_epg, events, repeat=1)
+    print(
+        f"eviction on all channels: incremental {update * 1000:.2f} ms"
+        f"  rebuild {rebuild * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
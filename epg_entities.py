@@ -0,0 +1,209 @@
+"""Lightweight EPG entities per channel or per channel group, fed by the EPG sensor."""
+import logging
+import time
+
+from homeassistant.helpers.entity import Entity
+
+_LOGGER = logging.getLogger(__name__)
+
+EPG_ENTITIES_NONE = "none"
+EPG_ENTITIES_CHANNEL = "channel"
+EPG_ENTITIES_GROUP = "group"
+
+ATTR_CHANNEL_ID = "channelid"
+ATTR_CHANNEL_NAME = "channel_name"
+ATTR_NOW = "now"
+ATTR_NEXT = "next"
+ATTR_WINDOW = "window"
+ATTR_CHANNELS = "channels"
+
+ICON_EPG = "mdi:television-guide"
+
+
+def _summary(event):
+    begin = int(event["START"])
+    return {
+        "start": begin,
+        "duration": int(event.get("DURATION") or 0),
+        "eventid": event.get("EVENTID"),
+        "title": event.get("TITLE"),
+        "subtitle": event.get("SUBTITLE"),
+    }
+
+
+def channel_view(channel, now, window):
+    """
+    Running and next event of a stored channel and the events starting within
+    `window` seconds, plus the time the view changes by itself.
+    :return (view, next_change)
+    """
+    running = following = None
+    upcoming = []
+    for start, event in channel["epg"].items():
+        begin = int(start)
+        end = begin + int(event.get("DURATION") or 0)
+        if end <= now:
+            continue
+        if begin <= now and running is None:
+            running = event
+        elif following is None:
+            following = event
+        if begin < now + window:
+            upcoming.append(_summary(event))
+        elif following is not None:
+            break
+    if running is not None:
+        next_change = int(running["START"]) + int(running.get("DURATION") or 0)
+    elif following is not None:
+        next_change = int(following["START"])
+    else:
+        next_change = None
+    view = {
+        ATTR_CHANNEL_ID: channel["meta"].get("channelid"),
+        ATTR_CHANNEL_NAME: channel["channeldata"].get("name")
+        or channel["meta"].get("channelname"),
+        ATTR_NOW: _summary(running) if running is not None else None,
+        ATTR_NEXT: _summary(following) if following is not None else None,
+        ATTR_WINDOW: upcoming,
+    }
+    return view, next_change
+
+
+class VdrEpgEntity(Entity):
+    """EPG of one channel (state: running title) or one group (state: channels)."""
+
+    def __init__(self, name, group=False):
+        self._name = name
+        self._group = group
+        self._state = None
+        self._attributes = {}
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return ICON_EPG
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def state_attributes(self):
+        return self._attributes
+
+    def set_view(self, views):
+        """Takes the views of its channel(s), writes the state if already added."""
+        if self._group:
+            self._state = len(views)
+            self._attributes = {ATTR_CHANNELS: views}
+        else:
+            view = next(iter(views.values()), None)
+            self._state = ((view or {}).get(ATTR_NOW) or {}).get("title")
+            self._attributes = dict(view) if view else {}
+        if self.hass is not None:
+            self.schedule_update_ha_state()
+
+
+class EpgEntities(object):
+    """
+    Creates the EPG entities of a VDR as channels show up in the EPG store and
+    updates only those whose channel changed or whose running event ended.
+    Called from the EPG sensor's update, so the store is never read concurrently.
+    """
+
+    def __init__(
+        self,
+        conf_name,
+        store,
+        add_entities,
+        mode=EPG_ENTITIES_CHANNEL,
+        window=3 * 3600,
+        clock=time.time,
+    ):
+        self.conf_name = conf_name
+        self.store = store
+        self.add_entities = add_entities
+        self.mode = mode
+        self.window = window
+        self.clock = clock
+        # key (channel id or group) -> entity
+        self.entities = {}
+        # channel id -> key, kept for channels that left the store
+        self._keys = {}
+        # key -> {channel id: (view, next_change)}
+        self._views = {}
+        # key -> time its view changes by itself
+        self._next_change = {}
+
+    def _key(self, channelid, channel, dirty):
+        if self.mode != EPG_ENTITIES_GROUP:
+            return channelid
+        old = self._keys.get(channelid)
+        if channel is None:
+            return old
+        key = self._keys[channelid] = channel["channeldata"].get("group") or ""
+        if old is not None and old != key:
+            # moved to another group, leaves the old one
+            dirty.setdefault(old, set()).add(channelid)
+        return key
+
+    def _add_entity(self, key, channel):
+        prefix = f"{self.conf_name.capitalize()} EPG"
+        if self.mode == EPG_ENTITIES_GROUP:
+            entity = VdrEpgEntity(f"{prefix} {key or 'Channels'}", group=True)
+        else:
+            entity = VdrEpgEntity(f"{prefix} {channel['channeldata'].get('name')}")
+        self.entities[key] = entity
+        self.add_entities([entity])
+        _LOGGER.debug("Added EPG entity %s", entity.name)
+        return entity
+
+    """
+    Refreshes the entities of the given (changed) channels and the ones whose
+    running event ended since the last call, the window moves on with the running
+    event. Entities are only written if their view changed.
+    """
+
+    def update(self, channelids=(), now=None):
+        if now is None:
+            now = self.clock()
+        dirty = {}
+        for channelid in channelids:
+            key = self._key(channelid, self.store.get_channel(channelid), dirty)
+            if key is not None:
+                dirty.setdefault(key, set()).add(channelid)
+        for key, change in self._next_change.items():
+            if change is not None and change <= now:
+                dirty.setdefault(key, set()).update(self._views.get(key, ()))
+        for key, channelids in dirty.items():
+            previous = {
+                channelid: view
+                for channelid, (view, _) in self._views.get(key, {}).items()
+            }
+            views = dict(self._views.get(key, {}))
+            for channelid in channelids:
+                channel = self.store.get_channel(channelid)
+                if channel is None or self._keys.get(channelid, key) != key:
+                    views.pop(channelid, None)
+                else:
+                    views[channelid] = channel_view(channel, now, self.window)
+            self._views[key] = views
+            changes = [change for _, change in views.values() if change is not None]
+            self._next_change[key] = min(changes) if changes else None
+            shown = {channelid: view for channelid, (view, _) in views.items()}
+            entity = self.entities.get(key)
+            if entity is None:
+                if not shown:
+                    continue
+                channel = self.store.get_channel(next(iter(shown)))
+                entity = self._add_entity(key, channel)
+            elif shown == previous:
+                continue
+            entity.set_view(shown)
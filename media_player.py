@@ -28,6 +28,8 @@ from homeassistant.const import (
 import homeassistant.helpers.config_validation as cv
 import homeassistant.util.dt as dt_util
 
+from .tgpyvdr.tgpyvdr import PYVDR
+
 _LOGGER = logging.getLogger(__name__)
 
 CONF_ARGUMENTS = "arguments"
@@ -82,17 +84,25 @@ def get_logo_url(chan_name):
         return ""
 
 
+def get_current_title(epg):
+    for channel in (epg or {}).values():
+        for event in channel.values():
+            if isinstance(event, dict):
+                return event.get("TITLE")
+    return None
+
+
 def setup_platform(hass, config, add_entities, discovery_info=None):
     _LOGGER.debug('Set up VDR with hostname , timeout=')
 
     """Set up the vdr platform."""
-    from pyvdr import PYVDR
-
     conf_name = config.get(CONF_NAME)
     host = config.get(CONF_HOST)
     _LOGGER.debug('Set up VDR with hostname {}, timeout={}'.format(host, config['timeout']))
 
-    pyvdr_con = PYVDR(hostname=host)
+    pyvdr_con = PYVDR(
+        hostname=host, port=config[CONF_PORT], timeout=config[CONF_TIMEOUT]
+    )
 
     add_entities(
         [VdrDevice(conf_name, pyvdr_con)]
@@ -124,10 +134,12 @@ class VdrDevice(MediaPlayerEntity):
             if channel is None:
                 return False
 
-            epg_info = self._pyvdr.get_channel_epg_info(channel_no=channel['number'])
+            epg_info = self._pyvdr.get_channel_epg_info(
+                channel_no=channel['number'], filter="now"
+            )
 
             self._media_artist = channel['name']
-            self._media_title = epg_info.Title
+            self._media_title = get_current_title(epg_info)
             self._state = STATE_PLAYING
             self._media_image_url = get_logo_url(channel['name'])
         except Exception:
@@ -0,0 +1,126 @@
+"""Profiling of sensor update cycles and PYVDR calls on demand."""
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# cProfile uses the interpreter wide sys.monitoring slot (Python 3.12+),
+# only one thread of the process may profile at a time
+_PROFILER_LOCK = threading.Lock()
+
+
+class ProfileSession:
+    """Profiles the next `cycles` runs of the selected sensor updates and PYVDR methods."""
+
+    def __init__(self, cycles=1, sensor_types=None, methods=None, top=20, on_done=None):
+        self.cycles = cycles
+        self.sensor_types = set(sensor_types or ())
+        self.methods = list(methods or ())
+        self.top = top
+        self.on_done = on_done
+        self.stats = None
+        self.started = time.time()
+        self._runs = {}
+        self._lock = threading.Lock()
+        self._pyvdr = None
+        self._originals = {}
+        self._local = threading.local()
+        self._finished = False
+
+    def covers(self, sensor_type):
+        """Return True if the update of this sensor type is still to be profiled."""
+        with self._lock:
+            return (
+                sensor_type in self.sensor_types
+                and self._runs.get(sensor_type, 0) < self.cycles
+            )
+
+    def run(self, key, func, *args, **kwargs):
+        """Run func under its own profiler and merge the result into the session."""
+        if getattr(self._local, "active", False):
+            # already inside a profiled call of this thread, profilers do not nest
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._collect(key, None)
+        if not _PROFILER_LOCK.acquire(blocking=False):
+            # another thread is profiling, run unprofiled and leave the cycle to a later call
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        self._local.active = True
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self._local.active = False
+            _PROFILER_LOCK.release()
+            self._collect(key, profile)
+
+    def _collect(self, key, profile):
+        with self._lock:
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            self._runs[key] = self._runs.get(key, 0) + 1
+            done = not self._finished and self._done()
+            if done:
+                self._finished = True
+        if done:
+            self.finish()
+
+    def _done(self):
+        keys = list(self.sensor_types) + self.methods
+        return all(self._runs.get(key, 0) >= self.cycles for key in keys)
+
+    def attach(self, pyvdr):
+        """Wrap the selected methods of a PYVDR instance."""
+        self._pyvdr = pyvdr
+        for name in list(self.methods):
+            original = getattr(pyvdr, name, None)
+            if not callable(original):
+                _LOGGER.warning("PYVDR has no method %s to profile", name)
+                self.methods.remove(name)
+                continue
+            self._originals[name] = original
+            setattr(pyvdr, name, self._wrap(name, original))
+
+    def _wrap(self, name, original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                active = self._runs.get(name, 0) < self.cycles
+            if not active:
+                return original(*args, **kwargs)
+            return self.run(name, original, *args, **kwargs)
+
+        return wrapper
+
+    def detach(self):
+        for name in self._originals:
+            # instance attribute shadows the class method, removing it restores it
+            self._pyvdr.__dict__.pop(name, None)
+        self._originals = {}
+
+    def finish(self):
+        self.detach()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def summary(self):
+        """Top functions by cumulative time as text."""
+        if self.stats is None:
+            return "no samples"
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        return out.getvalue()
+
+    def dump(self, path):
+        if self.stats is not None:
+            self.stats.dump_stats(path)
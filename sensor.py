@@ -6,6 +6,33 @@ from datetime import timedelta
 from datetime import datetime
 
 from .tgpyvdr.tgpyvdr import PYVDR
+from .tgpyvdr.epgstore import EpgStore
+from .tgpyvdr.epggrid import EpgGrid
+from .tgpyvdr.epgindex import EpgSearchIndex
+from .tgpyvdr.epgworker import EpgWorkerPool
+from .tgpyvdr.epgfile import EPG_FILE_DEFAULT_PATH
+from .tgpyvdr.epgfile import EpgFile
+from .tgpyvdr.conffiles import VdrConfFiles
+from .tgpyvdr.epgcodec import encode_channels
+from .tgpyvdr.epgcodec import pack
+from .tgpyvdr.scope import DEPTH_FULL
+from .tgpyvdr.scope import DEPTH_NOWNEXT
+from .tgpyvdr.scope import DEPTH_SKIP
+from .tgpyvdr.scope import ChannelScope
+from .tgpyvdr.scope import now_next
+from .tgpyvdr.refresh import RollingRefresh
+from .tgpyvdr.recstate import RecordingState
+from .tgpyvdr.intervals import TimerSchedule
+from .tgpyvdr.delta import diff_events
+from .tgpyvdr.delta import diff_timers
+from .services import DOMAIN
+from .services import register_vdr
+from .websocket import async_setup_websocket
+from .epg_entities import EPG_ENTITIES_CHANNEL
+from .epg_entities import EPG_ENTITIES_GROUP
+from .epg_entities import EPG_ENTITIES_NONE
+from .epg_entities import EpgEntities
+from .websocket import signal_delta
 
 import voluptuous as vol
 
@@ -20,6 +47,7 @@ from homeassistant.const import (
     STATE_OFF,
     STATE_ON,
 )
+from homeassistant.helpers.dispatcher import dispatcher_send
 from homeassistant.util import Throttle
 import homeassistant.helpers.config_validation as cv
 
@@ -27,6 +55,42 @@ import homeassistant.helpers.config_validation as cv
 _LOGGER = logging.getLogger(__name__)
 
 CONF_DEFAULT_NAME = "vdr"
+CONF_EPG_PAST_HOURS = "epg_past_hours"
+CONF_EPG_DAYS = "epg_days"
+CONF_EPG_MAX_EVENTS = "epg_max_events_per_channel"
+CONF_EPG_MAX_SIZE = "epg_max_size_kb"
+CONF_EPG_DEDUP = "epg_dedup"
+CONF_TUNERS = "tuners"
+CONF_EPG_WORKERS = "epg_workers"
+CONF_EPG_REFRESH = "epg_refresh"
+CONF_EPG_SHARD_SIZE = "epg_shard_size"
+CONF_EPG_TICK_BUDGET = "epg_tick_budget"
+CONF_RECORDING_RECONCILE = "recording_reconcile"
+CONF_EPG_SOURCE = "epg_source"
+CONF_EPG_FILE = "epg_file"
+CONF_CONF_DIR = "conf_dir"
+CONF_EPG_CHANNELS = "epg_channels"
+CONF_EPG_FORMAT = "epg_format"
+CONF_EPG_ENTITIES = "epg_entities"
+CONF_EPG_ENTITY_WINDOW = "epg_entity_window"
+CONF_SVDRP_LIMITS = "svdrp_limits"
+CONF_COMMANDS_PER_SECOND = "commands_per_second"
+CONF_KB_PER_SECOND = "kb_per_second"
+CONF_BURST = "burst"
+CONF_FAVORITES = "favorites"
+CONF_GROUPS = "groups"
+CONF_NUMBERS = "numbers"
+CONF_OTHERS = "others"
+CONF_FAVORITES_INTERVAL = "favorites_interval"
+
+EPG_REFRESH_BURST = "burst"
+EPG_REFRESH_ROLLING = "rolling"
+
+EPG_SOURCE_SVDRP = "svdrp"
+EPG_SOURCE_FILE = "file"
+
+EPG_FORMAT_JSON = "json"
+EPG_FORMAT_COMPACT = "compact"
 
 # Validation of the user's configuration
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
@@ -35,6 +99,69 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_NAME, default=CONF_DEFAULT_NAME): cv.string,
         vol.Optional(CONF_PORT, default=6419): cv.port,
         vol.Optional(CONF_TIMEOUT, default=10): cv.byte,
+        vol.Optional(CONF_EPG_PAST_HOURS, default=2): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_EPG_DAYS): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_EPG_MAX_EVENTS): cv.positive_int,
+        vol.Optional(CONF_EPG_MAX_SIZE): cv.positive_int,
+        vol.Optional(CONF_EPG_DEDUP, default=True): cv.boolean,
+        vol.Optional(CONF_TUNERS, default=1): cv.positive_int,
+        vol.Optional(CONF_EPG_WORKERS, default=0): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=16)
+        ),
+        vol.Optional(CONF_EPG_REFRESH, default=EPG_REFRESH_BURST): vol.In(
+            [EPG_REFRESH_BURST, EPG_REFRESH_ROLLING]
+        ),
+        vol.Optional(CONF_EPG_SHARD_SIZE, default=10): cv.positive_int,
+        vol.Optional(CONF_EPG_TICK_BUDGET, default=5): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_RECORDING_RECONCILE, default=300): cv.positive_int,
+        vol.Optional(CONF_EPG_SOURCE, default=EPG_SOURCE_SVDRP): vol.In(
+            [EPG_SOURCE_SVDRP, EPG_SOURCE_FILE]
+        ),
+        vol.Optional(CONF_EPG_FILE, default=EPG_FILE_DEFAULT_PATH): cv.string,
+        vol.Optional(CONF_CONF_DIR): cv.string,
+        vol.Optional(CONF_EPG_FORMAT, default=EPG_FORMAT_JSON): vol.In(
+            [EPG_FORMAT_JSON, EPG_FORMAT_COMPACT]
+        ),
+        vol.Optional(CONF_EPG_ENTITIES, default=EPG_ENTITIES_NONE): vol.In(
+            [EPG_ENTITIES_NONE, EPG_ENTITIES_CHANNEL, EPG_ENTITIES_GROUP]
+        ),
+        vol.Optional(CONF_EPG_ENTITY_WINDOW, default=3): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_SVDRP_LIMITS): vol.Schema(
+            {
+                vol.Optional(CONF_COMMANDS_PER_SECOND): vol.All(
+                    vol.Coerce(float), vol.Range(min=0)
+                ),
+                vol.Optional(CONF_KB_PER_SECOND): vol.All(
+                    vol.Coerce(float), vol.Range(min=0)
+                ),
+                vol.Optional(CONF_BURST, default=1): vol.All(
+                    vol.Coerce(float), vol.Range(min=0.1)
+                ),
+            }
+        ),
+        vol.Optional(CONF_EPG_CHANNELS): vol.Schema(
+            {
+                vol.Optional(CONF_FAVORITES, default=[]): vol.All(
+                    cv.ensure_list, [cv.string]
+                ),
+                vol.Optional(CONF_GROUPS, default=[]): vol.All(
+                    cv.ensure_list, [cv.string]
+                ),
+                vol.Optional(CONF_NUMBERS, default=[]): vol.All(
+                    cv.ensure_list, [cv.string]
+                ),
+                vol.Optional(CONF_OTHERS, default=DEPTH_SKIP): vol.In(
+                    [DEPTH_SKIP, DEPTH_NOWNEXT, DEPTH_FULL]
+                ),
+                vol.Optional(CONF_FAVORITES_INTERVAL, default=5): cv.positive_int,
+            }
+        ),
     }
 )
 
@@ -45,6 +172,9 @@ ATTR_RECORDING_INSTANT = "recording_instant"
 ATTR_IS_RECORDING = "is_recording"
 ATTR_DISKSTAT_TOTAL = "disksize_total"
 ATTR_DISKSTAT_FREE = "disksize_free"
+ATTR_TIMER_CONFLICTS = "conflicts"
+ATTR_TIMER_PEAK = "peak_recordings"
+ATTR_TIMER_PEAK_TUNERS = "peak_tuners"
 ATTR_SENSOR_NAME = 0
 ATTR_ICON = 1
 ATTR_UNIT = 2
@@ -85,20 +215,152 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
         "Set up VDR with hostname {}, timeout={}".format(host, config["timeout"])
     )
 
-    pyvdr_con = PYVDR(hostname=host)
+    conf_dir = config.get(CONF_CONF_DIR)
+    pyvdr_con = PYVDR(
+        hostname=host,
+        port=config[CONF_PORT],
+        timeout=config[CONF_TIMEOUT],
+        conf_files=VdrConfFiles(conf_dir) if conf_dir else None,
+    )
+    _set_svdrp_limits(config, pyvdr_con)
+    epg_store = _create_epg_store(config)
+    epg_index = EpgSearchIndex()
+    epg_grid = EpgGrid()
+    recording_state = RecordingState(
+        reconcile=config.get(CONF_RECORDING_RECONCILE, 300)
+    )
+    register_vdr(
+        hass,
+        conf_name,
+        pyvdr=pyvdr_con,
+        epg_store=epg_store,
+        epg_index=epg_index,
+        epg_grid=epg_grid,
+    )
+    hass.add_job(async_setup_websocket, hass)
+
+    epg_file = None
+    if config.get(CONF_EPG_SOURCE) == EPG_SOURCE_FILE:
+        epg_file = EpgFile(config.get(CONF_EPG_FILE, EPG_FILE_DEFAULT_PATH))
+
+    epg_entities = _create_epg_entities(config, conf_name, epg_store, add_entities)
 
     entities = []
     for sensor_type in SENSOR_TYPES:
-        _LOGGER.debug("Setting up sensortype {}".format(sensor_type))
-        entities.append(VdrSensor(sensor_type, conf_name, pyvdr_con))
+        _LOGGER.debug("Setting up sensortype %s", sensor_type)
+        entities.append(
+            VdrSensor(
+                sensor_type,
+                conf_name,
+                pyvdr_con,
+                epg_store,
+                epg_index,
+                epg_grid=epg_grid,
+                tuners=config.get(CONF_TUNERS, 1),
+                epg_workers=config.get(CONF_EPG_WORKERS, 0),
+                epg_refresh=None if epg_file else _create_epg_refresh(config),
+                recording_state=recording_state,
+                epg_file=epg_file,
+                channel_scope=_create_channel_scope(config),
+                favorites_interval=_favorites_interval(config),
+                epg_format=config.get(CONF_EPG_FORMAT, EPG_FORMAT_JSON),
+                epg_entities=epg_entities,
+            )
+        )
 
     add_entities(entities)
 
 
+def _set_svdrp_limits(config, pyvdr):
+    """Apply the rate limits to all SVDRP clients of the host."""
+    limits = config.get(CONF_SVDRP_LIMITS)
+    if not limits:
+        return
+    kb = limits.get(CONF_KB_PER_SECOND)
+    pyvdr.svdrp.get_scheduler().set_limits(
+        commands=limits.get(CONF_COMMANDS_PER_SECOND),
+        reply_bytes=kb * 1024 if kb else None,
+        burst=limits.get(CONF_BURST, 1),
+    )
+
+
+def _create_epg_store(config):
+    """Create the EPG store with the configured retention policy."""
+    days = config.get(CONF_EPG_DAYS)
+    max_size = config.get(CONF_EPG_MAX_SIZE)
+    return EpgStore(
+        past=int(config.get(CONF_EPG_PAST_HOURS, 2) * 3600),
+        future=int(days * 86400) if days else None,
+        max_events=config.get(CONF_EPG_MAX_EVENTS),
+        max_size=max_size * 1024 if max_size else None,
+        dedup=config.get(CONF_EPG_DEDUP, True),
+    )
+
+
+def _create_epg_refresh(config):
+    """Create the rolling refresh schedule, None for the hourly burst."""
+    if config.get(CONF_EPG_REFRESH) != EPG_REFRESH_ROLLING:
+        return None
+    return RollingRefresh(
+        interval=MIN_TIME_BETWEEN_EPG_UPDATES.total_seconds(),
+        shard_size=config.get(CONF_EPG_SHARD_SIZE, 10),
+        budget=config.get(CONF_EPG_TICK_BUDGET, 5),
+    )
+
+
+def _create_channel_scope(config):
+    """Create the channel scope of the EPG, None to fetch every channel."""
+    scope = config.get(CONF_EPG_CHANNELS)
+    if not scope:
+        return None
+    return ChannelScope(
+        favorites=scope.get(CONF_FAVORITES),
+        groups=scope.get(CONF_GROUPS),
+        numbers=scope.get(CONF_NUMBERS),
+        others=scope.get(CONF_OTHERS, DEPTH_SKIP),
+    )
+
+
+def _create_epg_entities(config, conf_name, epg_store, add_entities):
+    """Create the manager of the per channel/group EPG entities, None if disabled."""
+    mode = config.get(CONF_EPG_ENTITIES, EPG_ENTITIES_NONE)
+    if mode == EPG_ENTITIES_NONE:
+        return None
+    return EpgEntities(
+        conf_name,
+        epg_store,
+        add_entities,
+        mode=mode,
+        window=int(config.get(CONF_EPG_ENTITY_WINDOW, 3) * 3600),
+    )
+
+
+def _favorites_interval(config):
+    scope = config.get(CONF_EPG_CHANNELS) or {}
+    return scope.get(CONF_FAVORITES_INTERVAL, 5) * 60
+
+
 class VdrSensor(Entity):
     """Representation of a Sensor."""
 
-    def __init__(self, sensor_type, conf_name, pyvdr):
+    def __init__(
+        self,
+        sensor_type,
+        conf_name,
+        pyvdr,
+        epg_store=None,
+        epg_index=None,
+        epg_grid=None,
+        tuners=1,
+        epg_workers=0,
+        epg_refresh=None,
+        recording_state=None,
+        epg_file=None,
+        channel_scope=None,
+        favorites_interval=300,
+        epg_format=EPG_FORMAT_JSON,
+        epg_entities=None,
+    ):
         """Initialize the sensor."""
         self._state = STATE_OFF
         self._sensor_type = sensor_type
@@ -108,7 +370,33 @@ class VdrSensor(Entity):
         self.runUpdateFactor = MIN_COUNTS_UPDATE
 
         self._Runs = 0
+        self._vdr_name = conf_name
         self._pyvdr = pyvdr
+        self._epg_store = epg_store if epg_store is not None else EpgStore()
+        self._epg_index = epg_index
+        self._epg_grid = epg_grid
+        self._tuners = tuners
+        self._epg_pool = None
+        self._epg_refresh = epg_refresh
+        # time of the last shard of the rolling refresh, the state between shards
+        self._epg_updated = None
+        self._epg_file = epg_file
+        self._channel_scope = channel_scope
+        self._favorites_interval = favorites_interval
+        self._epg_format = epg_format
+        self._epg_entities = epg_entities
+        self._favorites = []
+        self._favorites_refreshed = None
+        self._recording_state = (
+            recording_state if recording_state is not None else RecordingState()
+        )
+        if epg_workers and sensor_type == SENSOR_TYPE_VDREPG and epg_refresh is None:
+            self._epg_pool = EpgWorkerPool(epg_workers)
+        self._timers_json = None
+        self._timer_schedule = None
+        self._timers = []
+        # events last pushed to subscribers, per channel
+        self._published = {}
         self._init_attributes()
 
     def _init_attributes(self):
@@ -127,7 +415,7 @@ class VdrSensor(Entity):
             or self._Runs == 0
             or self._Runs % self.runUpdateFactor == 0
         ):
-            _LOGGER.info(f"UPDATE Runs {self._sensor_type} = true {self._Runs}")
+            _LOGGER.debug("UPDATE Runs %s = true %s", self._sensor_type, self._Runs)
             self._Runs = 1
             result = True
         else:
@@ -140,6 +428,237 @@ class VdrSensor(Entity):
             self._attributes = {}
         self._attributes.update({name: value})
 
+    def _update_timer_schedule(self, timers, timers_json):
+        """Recompute overlaps and tuner conflicts, only if LSTT changed."""
+        # every LSTT is a fresh look at the recording state as well
+        if not self._pyvdr.timers_cached:
+            self._recording_state.update_timers(timers)
+        if timers_json == self._timers_json:
+            return
+        self._timers_json = timers_json
+        delta = diff_timers(self._timers, timers)
+        self._timers = timers
+        if self.hass is not None:
+            self.hass.data[DOMAIN][self._vdr_name]["timers"] = timers
+        if delta is not None:
+            delta["type"] = "timers"
+            self._send_delta(delta)
+        self._timer_schedule = TimerSchedule(
+            timers, self._pyvdr.get_channels(), self._tuners
+        )
+        if self.hass is not None:
+            # local fallback of the timer_conflicts service
+            self.hass.data[DOMAIN][self._vdr_name]["timer_schedule"] = (
+                self._timer_schedule
+            )
+        everything = (0, 2**63)
+        self._set_attributes(
+            ATTR_TIMER_CONFLICTS, json.dumps(self._timer_schedule.conflicts())
+        )
+        self._set_attributes(
+            ATTR_TIMER_PEAK, self._timer_schedule.peak_recordings(*everything)
+        )
+        self._set_attributes(
+            ATTR_TIMER_PEAK_TUNERS, self._timer_schedule.peak_tuners(*everything)
+        )
+
+    def _send_delta(self, delta):
+        if self.hass is not None:
+            dispatcher_send(self.hass, signal_delta(self._vdr_name), delta)
+
+    def _scoped(self, channels):
+        """The channels to keep an EPG of, in refresh order."""
+        if self._channel_scope is None:
+            return [resp for resp in channels if resp.get("id")]
+        scoped = self._channel_scope.order(channels)
+        self._favorites = self._channel_scope.favorites_of(scoped)
+        self._favorites_refreshed = time.monotonic()
+        _LOGGER.debug(
+            "VDR EPG scope: %d of %d channels, %d favorites",
+            len(scoped),
+            len(channels),
+            len(self._favorites),
+        )
+        return scoped
+
+    def _depth(self, channel):
+        if self._channel_scope is None:
+            return DEPTH_FULL
+        return self._channel_scope.depth(channel)
+
+    def _refresh_favorites(self):
+        """Refresh the favorite channels in between the full EPG cycles."""
+        if not self._favorites:
+            return
+        if time.monotonic() - self._favorites_refreshed < self._favorites_interval:
+            return
+        self._favorites_refreshed = time.monotonic()
+        self._refresh_epg(
+            self._favorites, datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        )
+
+    def _refresh_epg(self, channels, updateTime):
+        """Fetch and publish the EPG channel by channel."""
+        filter = ""
+        for resp in channels:
+            id = resp.get("id")
+            if self._depth(resp) == DEPTH_NOWNEXT:
+                epg = self._pyvdr.get_channel_now_next(id)
+            else:
+                epg = self._pyvdr.get_channel_epg_info(id, filter)
+            if epg is None or not id in epg:
+                _LOGGER.debug("VDR EPG NONE for %s", id)
+                continue
+            channeldata = dict()
+            channeldata["channelid"] = id
+            channeldata["name"] = resp.get("name")
+            channeldata["group"] = resp.get("group")
+            channeldata["lastUpdate"] = updateTime
+            self._publish_epg(
+                self._epg_store.update_channel(id, channeldata, epg.get(id))
+            )
+
+    def _update_epg_rolling(self, get_timerlist):
+        """Refresh the shards due in this tick, the pass spreads over the EPG interval."""
+        refresh = self._epg_refresh
+        # most ticks refresh no shard, keep showing the last update
+        self._state = self._epg_updated or STATE_OFF
+        if refresh.needs_channels():
+            response = self._pyvdr.get_channels()
+            if response is None:
+                return
+            timers = get_timerlist(self)
+            if timers is not None:
+                self._set_attributes("timers", json.dumps(timers))
+            refresh.start_pass(self._scoped(response))
+
+        updateTime = datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        for shard in refresh.due():
+            self._refresh_epg(shard, updateTime)
+            self._state = self._epg_updated = updateTime
+
+        if refresh.completed():
+            # channels that left the list go once per pass, not on every idle tick
+            self._publish_epg(
+                self._epg_store.retain_channels(
+                    [resp.get("id") for resp in refresh.channels]
+                )
+            )
+
+    def _refresh_epg_file(self, channels, updateTime):
+        """Read the EPG from VDR's epg.data if it changed, False if it is not readable."""
+        if not self._epg_file.changed():
+            return self._epg_file.available()
+        epg = self._epg_file.read([resp.get("id") for resp in channels])
+        if epg is None:
+            return False
+        now = time.time()
+        for resp in channels:
+            id = resp.get("id")
+            if id not in epg:
+                continue
+            channeldata = dict()
+            channeldata["channelid"] = id
+            channeldata["name"] = resp.get("name")
+            channeldata["group"] = resp.get("group")
+            channeldata["lastUpdate"] = updateTime
+            events = epg[id]
+            if self._depth(resp) == DEPTH_NOWNEXT:
+                events = now_next(events, now)
+            self._publish_epg(self._epg_store.update_channel(id, channeldata, events))
+        return True
+
+    def _refresh_epg_parallel(self, channels, updateTime):
+        """Fetch the EPG channel by channel, parse and serialize it in worker processes."""
+        channeldata = {
+            resp["id"]: {
+                "channelid": resp["id"],
+                "name": resp.get("name"),
+                "group": resp.get("group"),
+                "lastUpdate": updateTime,
+            }
+            for resp in channels
+            if resp.get("id") and self._depth(resp) == DEPTH_FULL
+        }
+        lower, upper = self._epg_store.window()
+        # one LSTE per channel, interactive commands are not stuck behind the guide
+        parsed = self._epg_pool.parse(
+            self._pyvdr.iter_epg_raw(list(channeldata)),
+            channeldata,
+            lower,
+            upper,
+            self._epg_store.max_events,
+        )
+        for channelid, (meta, events, payload_json) in parsed.items():
+            epg = dict(meta)
+            epg.update(events)
+            changed = self._epg_store.update_channel(
+                channelid, channeldata[channelid], epg
+            )
+            # the worker's JSON is only valid if the size budget did not trim it
+            stored = self._epg_store.get_channel(channelid)
+            serialized = None
+            if stored is not None and len(stored["epg"]) == len(events):
+                serialized = {channelid: payload_json}
+            self._publish_epg(changed, serialized)
+        # channels at now/next depth are not worth the full transfer
+        self._refresh_epg(
+            [resp for resp in channels if self._depth(resp) == DEPTH_NOWNEXT],
+            updateTime,
+        )
+
+    async def async_will_remove_from_hass(self):
+        """Stop the EPG worker processes."""
+        if self._epg_pool is not None:
+            self._epg_pool.shutdown()
+
+    def _serialize_epg(self, channelid, payload, serialized=None):
+        """The attribute value of a channel in the configured EPG format."""
+        if self._epg_format == EPG_FORMAT_COMPACT:
+            return pack(encode_channels({channelid: payload}))
+        if serialized and channelid in serialized:
+            return serialized[channelid]
+        return json.dumps(payload)
+
+    def _publish_epg(self, channelids, serialized=None):
+        """Re-serialize the given channels from the EPG store into the attributes."""
+        deltas = {}
+        grid_changes = {}
+        for channelid in channelids:
+            payload = self._epg_store.channel_payload(channelid)
+            channel = self._epg_store.get_channel(channelid)
+            events = dict(channel["epg"]) if channel else {}
+            delta = diff_events(self._published.get(channelid), events)
+            if payload is None:
+                self._attributes.pop(f"{channelid}", None)
+                self._published.pop(channelid, None)
+            else:
+                # with EPG entities the channels are not duplicated in this sensor
+                if self._epg_entities is None:
+                    self._set_attributes(
+                        f"{channelid}",
+                        self._serialize_epg(channelid, payload, serialized),
+                    )
+                self._published[channelid] = events
+            if delta is not None:
+                delta["channeldata"] = payload["channeldata"] if payload else None
+                deltas[channelid] = delta
+            if self._epg_index is not None:
+                channel = self._epg_store.get_channel(channelid)
+                self._epg_index.update_channel(
+                    channelid, channel["epg"] if channel else None
+                )
+            if self._epg_grid is not None:
+                channel = self._epg_store.get_channel(channelid)
+                grid_changes[channelid] = channel["epg"] if channel else None
+        if grid_changes:
+            # one new set of columns for all changed channels
+            self._epg_grid.update(grid_changes)
+        if deltas:
+            self._send_delta({"type": "epg", "channels": deltas})
+        if self._epg_entities is not None:
+            self._epg_entities.update(channelids)
+
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -178,6 +697,19 @@ class VdrSensor(Entity):
         """Fetch new state data for the sensor.
         This is the only method that should fetch new data for Home Assistant.
         """
+        profiler = None
+        if self.hass is not None:
+            profiler = self.hass.data[DOMAIN][self._vdr_name].get("profiler")
+        if profiler is not None and profiler.covers(self._sensor_type):
+            profiler.run(self._sensor_type, self._update)
+        else:
+            self._update()
+
+    def _update(self):
+
+        if self._sensor_type == SENSOR_TYPE_VDREPG:
+            self._publish_epg(self._epg_store.evict())
+            self._refresh_favorites()
 
         if not self._updateRuns():
             return
@@ -218,7 +750,13 @@ class VdrSensor(Entity):
             return
 
         if self._sensor_type == SENSOR_TYPE_RECINFO:
-            response = self._pyvdr.is_recording()
+            recording_state = self._recording_state
+            if recording_state.needs_confirmation():
+                # the recording flags are only known to VDR itself
+                timers = self._pyvdr.get_timers(use_files=False)
+                if timers is not None:
+                    recording_state.update_timers(timers)
+            response = recording_state.recording
             if response is not None:
                 if response["instant"]:
                     self._state = "instant"
@@ -233,36 +771,46 @@ class VdrSensor(Entity):
                 self._attributes = {}
                 self._state = STATE_OFF
             return
-        def get_timerlist(self):
+        def get_timerlist(self, cached=False):
             timers=list()
             nextTimer=-1
             listPos=-1
             
-            response = self._pyvdr.get_timers()
-            if response is not None:
-                for resp in response:
-                    timers.append(resp)
-                    s=resp.get("start")
-                    s=s[:2] + ':' + s[2:]
-                    s=resp.get("date")+" "+s
-                    timer=time.mktime(datetime.strptime(s, "%Y-%m-%d %H:%M").timetuple())
-                    if nextTimer < 0 or nextTimer > timer:
-                        nextTimer=timer
-                        listPos=len(timers)-1
-                if listPos > -1:
-                    timers[listPos]["nextTimer"]=True
-                    timers[listPos]["nextTimerTime"]=s
+            response = self._pyvdr.get_timers(cached=cached)
+            if response is None:
+                # incomplete reply, keep the timers published last
+                return None
+            for resp in response:
+                timers.append(resp)
+                s=resp.get("start")
+                s=s[:2] + ':' + s[2:]
+                s=resp.get("date")+" "+s
+                timer=time.mktime(datetime.strptime(s, "%Y-%m-%d %H:%M").timetuple())
+                if nextTimer < 0 or nextTimer > timer:
+                    nextTimer=timer
+                    listPos=len(timers)-1
+            if listPos > -1:
+                timers[listPos]["nextTimer"]=True
+                timers[listPos]["nextTimerTime"]=s
             return timers
         
         if self._sensor_type == SENSOR_TYPE_TIMERS:
-            response = get_timerlist(self)
+            # LSTT only when the recording state wants a confirmation or the
+            # timers changed, otherwise the last list is published again
+            response = get_timerlist(
+                self, cached=not self._recording_state.needs_confirmation()
+            )
+            if response is None:
+                return
             state=STATE_OFF
+            timers_json = json.dumps(response)
+            self._update_timer_schedule(response, timers_json)
             if len(response) > 0:
                 state="no Timers defined"
                 self._set_attributes(
                     "timer",
-                    json.dumps(response)
-                )               
+                    timers_json
+                )
                 for resp in response:
                     key="nextTimer"
                     if key in resp and resp.get(key):
@@ -271,40 +819,47 @@ class VdrSensor(Entity):
             self._state=state 
             return
 
+        if self._sensor_type == SENSOR_TYPE_VDREPG and self._epg_refresh is not None:
+            self._update_epg_rolling(get_timerlist)
+            return
+
         if self._sensor_type == SENSOR_TYPE_VDREPG:
-            _LOGGER.info(f"UPDATE VDR SENSOR {self._sensor_type}")
-            _LOGGER.debug(f"UPDATE VDR SENSOR {self._sensor_type}")
-            self._set_attributes(
-                "timers",
-                json.dumps(get_timerlist(self)),
-                )
+            _LOGGER.debug("UPDATE VDR SENSOR %s", self._sensor_type)
+            timers = get_timerlist(self)
+            if timers is not None:
+                self._set_attributes(
+                    "timers",
+                    json.dumps(timers),
+                    )
             
             response = self._pyvdr.get_channels()
             if response is None:              
                 self.runUpdateFactor = MIN_COUNTS_UPDATE
                 return
-            _LOGGER.debug(f"UPDATE VDR SENSOR Result: {response}")
+            _LOGGER.debug("UPDATE VDR SENSOR Result: %s channels", len(response))
             self.runUpdateFactor = MIN_COUNTS_UPDATE_EPG
+            response = self._scoped(response)
 
             current_datetime = datetime.now()
             updateTime = current_datetime.strftime("%m/%d/%Y, %H:%M:%S")
             self._state = updateTime
             # response = self._pyvdr.get_channels()
-            filter = ""
-            for resp in response:
-                id = resp.get("id")
-                epg = self._pyvdr.get_channel_epg_info(id, filter)
-                if epg is None or not id in epg:
-                    _LOGGER.info(f"VDR EPG NONE {epg}")
-                    continue
-                channeldata = dict()
-                channeldata["channelid"] = id
-                channeldata["name"] = resp.get("name")
-                channeldata["lastUpdate"] = updateTime
-                self._set_attributes(
-                    f"{id}",
-                    json.dumps({"channeldata": channeldata, "epg": epg.get(id)}),
-                )
-            _LOGGER.info(f"VDR SENSOR {self._sensor_type} UPDATED {self._attributes}")
+            if self._epg_file is not None and self._refresh_epg_file(
+                response, updateTime
+            ):
+                _LOGGER.debug("VDR EPG read from %s", self._epg_file.path)
+            elif self._epg_pool is not None:
+                self._refresh_epg_parallel(response, updateTime)
+            else:
+                self._refresh_epg(response, updateTime)
+            self._publish_epg(
+                self._epg_store.retain_channels([resp.get("id") for resp in response])
+            )
+            _LOGGER.debug(
+                "VDR SENSOR %s UPDATED %d channels, %d events",
+                self._sensor_type,
+                len(self._epg_store),
+                self._epg_store.event_count(),
+            )
 
             return
@@ -0,0 +1,532 @@
+"""Services of the VDR integration."""
+import logging
+import json
+import os
+import time
+
+import voluptuous as vol
+
+from homeassistant.components import persistent_notification
+from homeassistant.core import SupportsResponse
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
+
+from .profiler import ProfileSession
+from .tgpyvdr.epgcodec import encode_channels
+from .tgpyvdr.epgcodec import pack
+from .tgpyvdr.epgsearch import SEARCH_MODE_EXACT
+from .tgpyvdr.timers import TIMER_OP_NEW
+from .tgpyvdr.timers import find_event
+from .tgpyvdr.timers import timer_from_event
+from .tgsvdrp.trace import TRACE
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "tgvdr"
+
+ATTR_VDR = "vdr"
+ATTR_QUERY = "query"
+ATTR_CHANNELS = "channels"
+ATTR_GENRES = "genres"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_LIMIT = "limit"
+ATTR_CYCLES = "cycles"
+ATTR_SENSOR_TYPES = "sensor_types"
+ATTR_METHODS = "methods"
+ATTR_TOP = "top"
+ATTR_ENABLE = "enable"
+ATTR_MAX_KB = "max_kb"
+ATTR_CLEAR = "clear"
+ATTR_EVENTS = "events"
+ATTR_CHANNEL = "channel"
+ATTR_EVENTID = "eventid"
+ATTR_MARGIN_BEFORE = "margin_before"
+ATTR_MARGIN_AFTER = "margin_after"
+ATTR_PRIORITY = "priority"
+ATTR_LIFETIME = "lifetime"
+ATTR_VPS = "vps"
+ATTR_IDS = "ids"
+ATTR_PAYLOAD = "payload"
+ATTR_MATCH = "match"
+ATTR_REMOTE = "remote"
+ATTR_RELEVANT = "relevant"
+
+MATCH_WORDS = "words"
+MATCH_TITLE = "title"
+
+SOURCE_LOCAL = "local"
+SOURCE_EPGSEARCH = "epgsearch"
+
+SERVICE_SEARCH_EPG = "search_epg"
+SERVICE_EPG_WINDOW = "epg_window"
+SERVICE_PROFILE = "profile"
+SERVICE_TRACE = "trace"
+SERVICE_DUMP_TRACE = "dump_trace"
+SERVICE_ADD_TIMERS = "add_timers"
+SERVICE_DELETE_TIMERS = "delete_timers"
+SERVICE_EPG_STATS = "epg_stats"
+SERVICE_TIMER_CONFLICTS = "timer_conflicts"
+SERVICE_SVDRP_STATS = "svdrp_stats"
+
+SEARCH_EPG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Optional(ATTR_QUERY, default=""): cv.string,
+        vol.Optional(ATTR_CHANNELS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_GENRES): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_LIMIT, default=100): cv.positive_int,
+        vol.Optional(ATTR_MATCH, default=MATCH_WORDS): vol.In(
+            [MATCH_WORDS, MATCH_TITLE]
+        ),
+        vol.Optional(ATTR_REMOTE, default=False): cv.boolean,
+    }
+)
+
+
+EPG_WINDOW_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Required(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_CHANNELS): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+PROFILE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_VDR): cv.string,
+            vol.Optional(ATTR_CYCLES, default=1): cv.positive_int,
+            vol.Optional(ATTR_SENSOR_TYPES, default=[]): vol.All(
+                cv.ensure_list, [cv.string]
+            ),
+            vol.Optional(ATTR_METHODS, default=[]): vol.All(
+                cv.ensure_list, [cv.string]
+            ),
+            vol.Optional(ATTR_TOP, default=20): cv.positive_int,
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_SENSOR_TYPES, ATTR_METHODS),
+)
+
+
+TRACE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENABLE): cv.boolean,
+        vol.Optional(ATTR_MAX_KB): cv.positive_int,
+    }
+)
+
+DUMP_TRACE_SCHEMA = vol.Schema({vol.Optional(ATTR_CLEAR, default=False): cv.boolean})
+
+ADD_TIMERS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Required(ATTR_EVENTS): vol.All(
+            cv.ensure_list,
+            [
+                vol.Schema(
+                    {
+                        vol.Required(ATTR_CHANNEL): cv.string,
+                        vol.Required(ATTR_EVENTID): cv.positive_int,
+                    }
+                )
+            ],
+        ),
+        vol.Optional(ATTR_MARGIN_BEFORE, default=2): cv.positive_int,
+        vol.Optional(ATTR_MARGIN_AFTER, default=10): cv.positive_int,
+        vol.Optional(ATTR_PRIORITY, default=50): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=99)
+        ),
+        vol.Optional(ATTR_LIFETIME, default=99): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=99)
+        ),
+        vol.Optional(ATTR_VPS, default=False): cv.boolean,
+    }
+)
+
+DELETE_TIMERS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Required(ATTR_IDS): vol.All(cv.ensure_list, [cv.positive_int]),
+    }
+)
+
+EPG_STATS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Optional(ATTR_PAYLOAD, default=False): cv.boolean,
+    }
+)
+
+TIMER_CONFLICTS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_VDR): cv.string,
+        vol.Optional(ATTR_REMOTE, default=True): cv.boolean,
+        vol.Optional(ATTR_RELEVANT, default=False): cv.boolean,
+    }
+)
+
+SVDRP_STATS_SCHEMA = vol.Schema({vol.Optional(ATTR_VDR): cv.string})
+
+
+def register_vdr(hass, name, **data):
+    """Make the shared objects of a configured VDR available to the services."""
+    vdrs = hass.data.setdefault(DOMAIN, {})
+    vdrs.setdefault(name, {}).update(data)
+    if not hass.services.has_service(DOMAIN, SERVICE_SEARCH_EPG):
+        setup_services(hass)
+    return vdrs[name]
+
+
+def get_vdr(hass, call):
+    """Return the data of the VDR addressed by a service call (default: the first)."""
+    vdrs = hass.data.get(DOMAIN, {})
+    name = call.data.get(ATTR_VDR)
+    if name is None:
+        return next(iter(vdrs.values()), None)
+    return vdrs.get(name)
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    return int(dt_util.as_timestamp(value))
+
+
+def search_epg(hass, call):
+    """Search the EPG, with epgsearch on the VDR if asked for and available."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {"events": []}
+    # epgsearch knows no genre groups, an empty query would list the whole guide
+    if call.data[ATTR_REMOTE] and call.data[ATTR_QUERY] and not call.data.get(
+        ATTR_GENRES
+    ):
+        events = _search_epgsearch(vdr, call)
+        if events is not None:
+            return {"source": SOURCE_EPGSEARCH, "events": events}
+    return {"source": SOURCE_LOCAL, "events": _search_local(vdr, call)}
+
+
+def _search_local(vdr, call):
+    """Search the locally held EPG."""
+    store = vdr["epg_store"]
+    query = call.data[ATTR_QUERY]
+    title = query.casefold() if call.data[ATTR_MATCH] == MATCH_TITLE else None
+    limit = call.data[ATTR_LIMIT]
+    keys = vdr["epg_index"].search(
+        query,
+        start=_timestamp(call.data.get(ATTR_START)),
+        end=_timestamp(call.data.get(ATTR_END)),
+        channels=call.data.get(ATTR_CHANNELS),
+        genres=call.data.get(ATTR_GENRES),
+        limit=None if title is not None else limit,
+    )
+    events = []
+    for channelid, start in keys:
+        channel = store.get_channel(channelid)
+        event = channel["epg"].get(start) if channel else None
+        if event is None:
+            continue
+        if title is not None and (event.get("TITLE") or "").casefold() != title:
+            continue
+        events.append(
+            {
+                "channelid": channelid,
+                "channelname": channel["meta"].get("channelname"),
+                "start": int(start),
+                "duration": int(event.get("DURATION") or 0),
+                "eventid": event.get("EVENTID"),
+                "title": event.get("TITLE"),
+                "subtitle": event.get("SUBTITLE"),
+                "genre": event.get("GENRE"),
+            }
+        )
+        if len(events) >= limit:
+            break
+    return events
+
+
+def _search_epgsearch(vdr, call):
+    """Search on the VDR with epgsearch, None if the plugin is not available."""
+    pyvdr = vdr["pyvdr"]
+    query = call.data[ATTR_QUERY]
+    if call.data[ATTR_MATCH] == MATCH_TITLE:
+        # all repeats and episodes of a series
+        results = pyvdr.epgsearch_query(
+            query, SEARCH_MODE_EXACT, subtitle=False, description=False
+        )
+    else:
+        results = pyvdr.epgsearch_query(query)
+    if results is None:
+        return None
+    start = _timestamp(call.data.get(ATTR_START))
+    end = _timestamp(call.data.get(ATTR_END))
+    channels = set(call.data.get(ATTR_CHANNELS) or ())
+    store = vdr["epg_store"]
+    events = []
+    for result in sorted(results, key=lambda r: (r["start"], r["channel"])):
+        if end is not None and result["start"] >= end:
+            continue
+        if start is not None and result["start"] + result["duration"] <= start:
+            continue
+        if channels and result["channelid"] not in channels:
+            continue
+        channel = store.get_channel(result["channelid"])
+        events.append(
+            {
+                "channelid": result["channelid"],
+                "channelname": channel["meta"].get("channelname") if channel else None,
+                "start": result["start"],
+                "duration": result["duration"],
+                "eventid": result["eventid"],
+                "title": result["title"],
+                "subtitle": result["subtitle"],
+                "genre": None,
+                "timer": result["timer"],
+            }
+        )
+        if len(events) >= call.data[ATTR_LIMIT]:
+            break
+    return events
+
+
+def timer_conflicts(hass, call):
+    """Timer conflicts as checked by epgsearch, else by the local timer schedule."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {"conflicts": []}
+    if call.data[ATTR_REMOTE]:
+        conflicts = vdr["pyvdr"].epgsearch_conflicts(call.data[ATTR_RELEVANT])
+        if conflicts is not None:
+            return {"source": SOURCE_EPGSEARCH, "conflicts": conflicts}
+    schedule = vdr.get("timer_schedule")
+    return {
+        "source": SOURCE_LOCAL,
+        "conflicts": schedule.conflicts() if schedule is not None else [],
+    }
+
+
+def profile(hass, call):
+    """Profile the next update cycles of sensors and/or PYVDR methods."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return
+    if vdr.get("profiler") is not None:
+        _LOGGER.warning("A profiling session is already running")
+        return
+
+    def on_done(session):
+        vdr["profiler"] = None
+        path = hass.config.path(
+            "tgvdr_profile_{}.prof".format(time.strftime("%Y%m%d_%H%M%S"))
+        )
+        session.dump(path)
+        persistent_notification.create(
+            hass,
+            "Stats written to `{}`\n\n```\n{}\n```".format(
+                os.path.basename(path), session.summary()
+            ),
+            title="VDR profile",
+            notification_id=f"{DOMAIN}_profile",
+        )
+
+    session = ProfileSession(
+        cycles=call.data[ATTR_CYCLES],
+        sensor_types=call.data[ATTR_SENSOR_TYPES],
+        methods=call.data[ATTR_METHODS],
+        top=call.data[ATTR_TOP],
+        on_done=on_done,
+    )
+    session.attach(vdr["pyvdr"])
+    if not session.sensor_types and not session.methods:
+        return
+    vdr["profiler"] = session
+
+
+def trace(hass, call):
+    """Start or stop capturing raw SVDRP exchanges into the ring buffer."""
+    if call.data[ATTR_ENABLE]:
+        max_kb = call.data.get(ATTR_MAX_KB)
+        TRACE.enable(max_kb * 1024 if max_kb else None)
+    else:
+        TRACE.disable()
+
+
+def dump_trace(hass, call):
+    """Write the SVDRP ring buffer to a file in the config directory."""
+    path = hass.config.path(
+        "tgvdr_trace_{}.log".format(time.strftime("%Y%m%d_%H%M%S"))
+    )
+    records = TRACE.dump(path)
+    if call.data[ATTR_CLEAR]:
+        TRACE.clear()
+    return {"path": path, "records": records}
+
+
+def add_timers(hass, call):
+    """Create timers for events of the locally held EPG in one VDR session."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {"results": []}
+    store = vdr["epg_store"]
+    results = []
+    ops = []
+    for item in call.data[ATTR_EVENTS]:
+        event = find_event(store, item[ATTR_CHANNEL], item[ATTR_EVENTID])
+        if event is None:
+            results.append(
+                {
+                    "op": TIMER_OP_NEW,
+                    "ok": False,
+                    "code": None,
+                    "message": "event not in the EPG",
+                }
+            )
+            continue
+        timer = timer_from_event(
+            item[ATTR_CHANNEL],
+            event,
+            margin_before=call.data[ATTR_MARGIN_BEFORE] * 60,
+            margin_after=call.data[ATTR_MARGIN_AFTER] * 60,
+            priority=call.data[ATTR_PRIORITY],
+            lifetime=call.data[ATTR_LIFETIME],
+            vps=call.data[ATTR_VPS],
+        )
+        results.append(None)
+        ops.append((TIMER_OP_NEW, timer))
+    written = iter(vdr["pyvdr"].write_timers(ops) if ops else ())
+    results = [result or next(written) for result in results]
+    for item, result in zip(call.data[ATTR_EVENTS], results):
+        result[ATTR_CHANNEL] = item[ATTR_CHANNEL]
+        result[ATTR_EVENTID] = item[ATTR_EVENTID]
+    return {"results": results}
+
+
+def delete_timers(hass, call):
+    """Delete timers by their VDR number in one VDR session."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {"results": []}
+    return {"results": vdr["pyvdr"].delete_timers(call.data[ATTR_IDS])}
+
+
+def _payload_stats(store):
+    payloads = {
+        channelid: store.channel_payload(channelid) for channelid in list(store.channels)
+    }
+    return {
+        "json_bytes": sum(len(json.dumps(p).encode()) for p in payloads.values()),
+        "compact_bytes": len(pack(encode_channels(payloads)).encode()),
+        "compact_zlib_bytes": len(pack(encode_channels(payloads), compress=True)),
+    }
+
+
+def epg_stats(hass, call):
+    """Size of the EPG store and what the shared event bodies save."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {}
+    store = vdr["epg_store"]
+    stats = store.stats()
+    if call.data[ATTR_PAYLOAD]:
+        # serializes the whole guide, only on request
+        stats["payload"] = _payload_stats(store)
+    return stats
+
+
+def svdrp_stats(hass, call):
+    """Wait and rate limit statistics of the SVDRP commands per priority class."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {}
+    scheduler = vdr["pyvdr"].svdrp.get_scheduler()
+    return {"host": scheduler.name, "classes": scheduler.get_stats()}
+
+
+def epg_window(hass, call):
+    """All events intersecting a time window, for the given or all channels."""
+    vdr = get_vdr(hass, call)
+    if vdr is None:
+        return {"events": []}
+    # kept up to date by the EPG sensor, like the search index
+    grid = vdr["epg_grid"]
+    rows = grid.window(
+        _timestamp(call.data[ATTR_START]),
+        _timestamp(call.data[ATTR_END]),
+        call.data.get(ATTR_CHANNELS),
+    )
+    return {"events": grid.rows(rows)}
+
+
+def setup_services(hass):
+    """Register the services of the integration."""
+    hass.services.register(
+        DOMAIN,
+        SERVICE_ADD_TIMERS,
+        lambda call: add_timers(hass, call),
+        schema=ADD_TIMERS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_DELETE_TIMERS,
+        lambda call: delete_timers(hass, call),
+        schema=DELETE_TIMERS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_SVDRP_STATS,
+        lambda call: svdrp_stats(hass, call),
+        schema=SVDRP_STATS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_TIMER_CONFLICTS,
+        lambda call: timer_conflicts(hass, call),
+        schema=TIMER_CONFLICTS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_EPG_STATS,
+        lambda call: epg_stats(hass, call),
+        schema=EPG_STATS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_EPG_WINDOW,
+        lambda call: epg_window(hass, call),
+        schema=EPG_WINDOW_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.register(
+        DOMAIN, SERVICE_TRACE, lambda call: trace(hass, call), schema=TRACE_SCHEMA
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_DUMP_TRACE,
+        lambda call: dump_trace(hass, call),
+        schema=DUMP_TRACE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        lambda call: profile(hass, call),
+        schema=PROFILE_SCHEMA,
+    )
+    hass.services.register(
+        DOMAIN,
+        SERVICE_SEARCH_EPG,
+        lambda call: search_epg(hass, call),
+        schema=SEARCH_EPG_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Command line access to a VDR without Home Assistant.
+
+    python -m tgvdr.tgpyvdr export epg --host vdr -o epg.ndjson
+    python -m tgvdr.tgpyvdr export timers --host vdr --format binary -o timers.bin
+    python -m tgvdr.tgpyvdr bench --host vdr
+
+Exports are streamed, the guide is written channel by channel as it arrives.
+The binary format is a sequence of frames: 4 byte big endian length followed by
+the zlib compressed JSON of one record.
+"""
+import argparse
+import json
+import logging
+import re
+import socket
+import statistics
+import struct
+import sys
+import time
+import zlib
+
+from ..tgsvdrp.tgsvdrp import SVDRP
+from ..tgsvdrp.tgsvdrp import split_lines
+from .tgpyvdr import EPG_DATA_RECORD
+from .tgpyvdr import PYVDR
+from .tgpyvdr import iter_epg_records
+from .tgpyvdr import parse_epg_records
+
+_LOGGER = logging.getLogger(__name__)
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_BINARY = "binary"
+
+_FRAME_HEADER = struct.Struct(">I")
+
+_RECORDING = re.compile(
+    r"^(\d\d\.\d\d\.\d\d) (\d\d:\d\d)(?: (\d+:\d\d))?(\*?) (.*)$"
+)
+
+BENCH_COMMANDS = ("STAT DISK", "CHAN", "LSTT", "LSTC :ids :groups", "LSTR", "LSTE")
+
+
+class NdjsonWriter(object):
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def write(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False).encode())
+        self.out.write(b"\n")
+        self.count += 1
+
+
+class BinaryWriter(object):
+    def __init__(self, out, level=6):
+        self.out = out
+        self.level = level
+        self.count = 0
+
+    def write(self, record):
+        data = zlib.compress(
+            json.dumps(record, separators=(",", ":")).encode(), self.level
+        )
+        self.out.write(_FRAME_HEADER.pack(len(data)))
+        self.out.write(data)
+        self.count += 1
+
+
+"""
+Reads the records of a binary export.
+:return iterator of dicts
+"""
+
+
+def read_binary(stream):
+    while True:
+        header = stream.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            return
+        (size,) = _FRAME_HEADER.unpack(header)
+        yield json.loads(zlib.decompress(stream.read(size)))
+
+
+def _data_lines(pyvdr, cmd, code=250):
+    return (line for line in pyvdr.svdrp.iter_cmd(cmd) if line.code == code)
+
+
+def export_epg(pyvdr, writer):
+    lines = _data_lines(pyvdr, "LSTE", EPG_DATA_RECORD)
+    for channelid, channel in iter_epg_records(lines):
+        events = [
+            event for start, event in channel.items() if isinstance(event, dict)
+        ]
+        writer.write(
+            {
+                "channelid": channelid,
+                "channelname": channel.get("channelname"),
+                "events": events,
+            }
+        )
+
+
+def export_channels(pyvdr, writer):
+    for line in _data_lines(pyvdr, "LSTC :ids :groups"):
+        channel = PYVDR._parse_channels_response(line)
+        if channel:
+            writer.write(channel)
+
+
+def export_timers(pyvdr, writer):
+    for line in _data_lines(pyvdr, "LSTT"):
+        timer = PYVDR._parse_timer_response(line)
+        if timer:
+            writer.write(timer)
+
+
+def export_recordings(pyvdr, writer):
+    for line in _data_lines(pyvdr, "LSTR"):
+        recording = {"number": line.Separator}
+        match = _RECORDING.match(line.Value)
+        if match:
+            recording["date"] = match.group(1)
+            recording["time"] = match.group(2)
+            recording["length"] = match.group(3)
+            recording["new"] = match.group(4) == "*"
+            recording["name"] = match.group(5)
+        else:
+            recording["name"] = line.Value
+        writer.write(recording)
+
+
+EXPORTS = {
+    "epg": export_epg,
+    "channels": export_channels,
+    "timers": export_timers,
+    "recordings": export_recordings,
+}
+
+
+"""
+Parses a reply like the integration does, only lines with the data code of the
+command (215 for LSTE, 250 otherwise) count as items.
+:return (items, reply code of the command or None without reply)
+"""
+
+
+def _parse_reply(cmd, raw, encoding):
+    lines = split_lines(raw, encoding)
+    # the raw exchange starts with the greeting (220) and ends with the goodbye (221)
+    reply = [line for line in lines if line.code not in (220, 221)]
+    code = reply[0].code if reply else None
+    verb = cmd.split()[0].upper()
+    if verb == "LSTE":
+        items = sum(
+            len(channel) - 2
+            for channel in parse_epg_records(
+                line for line in lines if line.code == EPG_DATA_RECORD
+            ).values()
+        )
+    elif verb == "LSTC":
+        items = len(
+            [PYVDR._parse_channels_response(line) for line in lines if line.code == 250]
+        )
+    elif verb == "LSTT":
+        items = len(
+            [PYVDR._parse_timer_response(line) for line in lines if line.code == 250]
+        )
+    else:
+        # decode every line, the cost of plain text replies
+        items = len([line.Value for line in lines if line.code == 250])
+    return items, code
+
+
+def _reply_note(code, partial):
+    if code is None:
+        return "  (no reply)"
+    if not 200 <= code < 300:
+        return f"  (error {code})"
+    if partial:
+        return "  (partial)"
+    return ""
+
+
+"""
+Time from connect to the complete greeting, i.e. the latency a command pays
+before it can be sent.
+:return seconds
+"""
+
+
+def connect_latency(host, port, timeout):
+    begin = time.perf_counter()
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        data = b""
+        while b"\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        elapsed = time.perf_counter() - begin
+        sock.sendall(b"quit\r\n")
+    return elapsed
+
+
+def bench(host, port, timeout, commands, repeat, out):
+    latencies = [connect_latency(host, port, timeout) for _ in range(repeat)]
+    out.write(
+        "connect  median {:.1f} ms  max {:.1f} ms\n".format(
+            statistics.median(latencies) * 1000, max(latencies) * 1000
+        )
+    )
+    svdrp = SVDRP(hostname=host, port=port, timeout=timeout)
+    out.write(
+        "{:20s} {:>10s} {:>10s} {:>12s} {:>12s} {:>10s}\n".format(
+            "command", "bytes", "wire ms", "wire MB/s", "parse MB/s", "items"
+        )
+    )
+    for cmd in commands:
+        wire = parse = 0.0
+        size = items = 0
+        code = None
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            raw = svdrp.send_cmd_raw(cmd)
+            middle = time.perf_counter()
+            items, code = _parse_reply(cmd, raw, svdrp.server_encoding)
+            wire += middle - begin
+            parse += time.perf_counter() - middle
+            size = len(raw)
+        wire /= repeat
+        parse /= repeat
+        out.write(
+            "{:20s} {:10d} {:10.1f} {:12.2f} {:12.2f} {:10d}{}\n".format(
+                cmd,
+                size,
+                wire * 1000,
+                size / wire / 1e6 if wire else 0.0,
+                size / parse / 1e6 if parse else 0.0,
+                items,
+                _reply_note(code, svdrp.partial),
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tgpyvdr")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6419)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="stream data of the VDR to a file")
+    export.add_argument("what", choices=sorted(EXPORTS))
+    export.add_argument(
+        "--format", choices=(FORMAT_NDJSON, FORMAT_BINARY), default=FORMAT_NDJSON
+    )
+    export.add_argument("-o", "--output", help="file name, default stdout")
+
+    measure = commands.add_parser("bench", help="latency, transfer and parse rates")
+    measure.add_argument(
+        "--commands",
+        nargs="+",
+        default=BENCH_COMMANDS,
+        help="SVDRP command lines to measure",
+    )
+    measure.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    if args.command == "bench":
+        bench(args.host, args.port, args.timeout, args.commands, args.repeat, sys.stdout)
+        return 0
+
+    pyvdr = PYVDR(hostname=args.host, port=args.port, timeout=args.timeout)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        if args.format == FORMAT_BINARY:
+            writer = BinaryWriter(out)
+        else:
+            writer = NdjsonWriter(out)
+        EXPORTS[args.what](pyvdr, writer)
+    finally:
+        if args.output:
+            out.close()
+    if pyvdr.svdrp.partial:
+        _LOGGER.warning("Reply of VDR was incomplete, the export is partial")
+        return 1
+    _LOGGER.info("Exported %d records", writer.count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import logging
+import os
+
+from .tgpyvdr import channel_group_name
+
+_LOGGER = logging.getLogger(__name__)
+
+CONF_FILES_DEFAULT_DIR = "/etc/vdr"
+CHANNELS_CONF = "channels.conf"
+TIMERS_CONF = "timers.conf"
+CONF_FILES_ENCODING = "utf-8"
+
+_POLARIZATION = {"H": 100000, "V": 200000, "L": 300000, "R": 400000}
+
+
+def _transponder(source, frequency, parameters):
+    # VDR's cChannel::Transponder(), used as tid when nid and tid are 0
+    while frequency > 20000:
+        frequency //= 1000
+    if source.startswith("S"):
+        for param in parameters.upper():
+            if param in _POLARIZATION:
+                return frequency + _POLARIZATION[param]
+    return frequency
+
+
+"""
+Channel id (source-nid-tid-sid[-rid]) of a channels.conf line, as listed by LSTC :ids.
+:return channel id or None
+"""
+
+
+def channel_id(fields):
+    try:
+        source = fields[3]
+        sid, nid, tid, rid = (int(fields[i]) for i in (9, 10, 11, 12))
+        if not nid and not tid:
+            tid = _transponder(source, int(fields[1]), fields[2])
+    except (IndexError, ValueError):
+        return None
+    parts = [source, str(nid), str(tid), str(sid)]
+    if rid:
+        parts.append(str(rid))
+    return "-".join(parts)
+
+
+"""
+Parses channels.conf into the structure of PYVDR.get_channels(): one
+{"number", "id", "name", "group"} per channel and {} for group separators.
+:return list
+"""
+
+
+def parse_channels_conf(text):
+    channels = []
+    number = 1
+    group = ""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(":"):
+            # ":@201 Group" continues the numbering at 201
+            if line.startswith(":@"):
+                first = line[2:].split(None, 1)
+                if first and first[0].isdigit():
+                    number = int(first[0])
+            group = channel_group_name(line)
+            channels.append({})
+            continue
+        fields = line.split(":")
+        id = channel_id(fields)
+        if id is None:
+            _LOGGER.debug("Skipping channels.conf line %s", line)
+            continue
+        channels.append(
+            {
+                "number": str(number),
+                "id": id,
+                "name": fields[0].split(";", 1)[0],
+                "group": group,
+            }
+        )
+        number += 1
+    return channels
+
+
+class ConfFile(object):
+    """A VDR config file, parsed again only when its inode or mtime changed."""
+
+    def __init__(self, path, encoding=CONF_FILES_ENCODING):
+        self.path = path
+        self.encoding = encoding
+        self.stamp = None
+        self.text = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    """
+    Content of the file, reread if it changed.
+    :return (text, changed) or (None, False) if the file is not accessible
+    """
+
+    def read(self):
+        stamp = self._stat()
+        if stamp is None:
+            self.stamp = self.text = None
+            return None, False
+        if stamp == self.stamp:
+            return self.text, False
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            _LOGGER.debug("Unable to read %s: %s", self.path, e)
+            self.stamp = self.text = None
+            return None, False
+        self.stamp = stamp
+        self.text = data.decode(self.encoding, "replace")
+        _LOGGER.debug("Read %s", self.path)
+        return self.text, True
+
+
+class VdrConfFiles(object):
+    """
+    Channels from VDR's config directory for a VDR on the same host or a shared
+    filesystem, cached until channels.conf changes; None means the file is not
+    accessible and the caller should use SVDRP instead. timers.conf is only
+    stat()ed to tell whether the timers changed, the timers themselves and their
+    ids always come from LSTT.
+    """
+
+    def __init__(self, directory=CONF_FILES_DEFAULT_DIR, encoding=CONF_FILES_ENCODING):
+        self.directory = directory
+        self.channels_file = ConfFile(os.path.join(directory, CHANNELS_CONF), encoding)
+        self.timers_file = ConfFile(os.path.join(directory, TIMERS_CONF), encoding)
+        self._channels = None
+
+    def _load_channels(self):
+        text, changed = self.channels_file.read()
+        if text is None:
+            self._channels = None
+        elif changed or self._channels is None:
+            self._channels = parse_channels_conf(text)
+        return self._channels
+
+    def get_channels(self):
+        channels = self._load_channels()
+        if channels is None:
+            return None
+        return [dict(channel) for channel in channels]
+
+    """
+    Identifies the current content of channels.conf and timers.conf. VDR saves
+    timers.conf whenever a timer changes, an unchanged stamp means unchanged timers.
+    :return stamp, None if a file is not accessible
+    """
+
+    def timers_stamp(self):
+        channels = self.channels_file._stat()
+        timers = self.timers_file._stat()
+        if channels is None or timers is None:
+            return None
+        return channels, timers
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+
+"""
+Differences between two versions of a channel's events ({start: event}).
+:return dict with "added" and "changed" ({start: event}) and "removed" ([start]),
+        None if nothing changed
+"""
+
+
+def diff_events(old, new):
+    old = old or {}
+    new = new or {}
+    added = {}
+    changed = {}
+    for start, event in new.items():
+        previous = old.get(start)
+        if previous is None:
+            added[start] = event
+        elif previous is not event and previous != event:
+            changed[start] = event
+    removed = [start for start in old if start not in new]
+    if not (added or changed or removed):
+        return None
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def timer_key(timer):
+    return timer.get("timerid") or "{}:{}:{}".format(
+        timer.get("channel"), timer.get("date"), timer.get("start")
+    )
+
+
+"""
+Differences between two timer lists (as returned by PYVDR.get_timers).
+:return dict with "added", "changed" (lists of timers) and "removed" (keys),
+        None if nothing changed
+"""
+
+
+def diff_timers(old, new):
+    old = {timer_key(t): t for t in old or () if t}
+    new = {timer_key(t): t for t in new or () if t}
+    delta = diff_events(old, new)
+    if delta is None:
+        return None
+    return {
+        "added": list(delta["added"].values()),
+        "changed": list(delta["changed"].values()),
+        "removed": delta["removed"],
+    }
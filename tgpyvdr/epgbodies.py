@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+BODY_FIELDS = ("TITLE", "SUBTITLE", "DESCRIPTION", "GENRE")
+
+
+def _body_size(body):
+    return sum(len(value) for value in body if value is not None)
+
+
+class EventBodies(object):
+    """
+    Content addressed pool of event bodies (title, subtitle, description, genre).
+    Simulcasts (HD/SD) and regional variants broadcast the same programme on
+    several channels; interned events of all channels refer to one copy of the
+    strings. Bodies are reference counted and dropped with their last event.
+    """
+
+    def __init__(self, fields=BODY_FIELDS):
+        self.fields = fields
+        # body -> [body, references], the first stored body is the shared copy
+        self._bodies = {}
+        self._references = 0
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def _key(self, event):
+        return tuple(event.get(field) for field in self.fields)
+
+    """
+    Replaces the body fields of the event (in place) by the shared copy.
+    :return the event
+    """
+
+    def intern(self, event):
+        key = self._key(event)
+        entry = self._bodies.get(key)
+        if entry is None:
+            entry = self._bodies[key] = [key, 0]
+        elif entry[0] is not key:
+            for field, value in zip(self.fields, entry[0]):
+                if value is not None:
+                    event[field] = value
+        entry[1] += 1
+        self._references += 1
+        return event
+
+    def release(self, event):
+        key = self._key(event)
+        entry = self._bodies.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        self._references -= 1
+        if entry[1] <= 0:
+            del self._bodies[key]
+
+    def clear(self):
+        self._bodies = {}
+        self._references = 0
+
+    """
+    Characters of all bodies as referenced by the events (what a per channel
+    payload repeats) against the characters actually held.
+    :return dict
+    """
+
+    def stats(self):
+        referenced = 0
+        stored = 0
+        for body, references in self._bodies.values():
+            size = _body_size(body)
+            referenced += size * references
+            stored += size
+        return {
+            "events": self._references,
+            "bodies": len(self._bodies),
+            "shared_events": self._references - len(self._bodies),
+            "referenced_chars": referenced,
+            "stored_chars": stored,
+            "saved_chars": referenced - stored,
+        }
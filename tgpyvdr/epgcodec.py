@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Compact encoding of EPG payloads ({channelid: {"channeldata", "epg"}} as built by
+EpgStore.channel_payload) for the frontend.
+
+Decoder contract (version 1):
+
+    {
+      "v": 1,
+      "f": [[name, type], ...],   # event fields in array order
+      "s": ["text", ...],         # string table
+      "c": [[channelid, channeldata, meta, events], ...]
+    }
+
+- channeldata and meta are plain objects (meta holds the non-event keys of
+  "epg", e.g. channelid and channelname).
+- events is a list of arrays, one value per entry of "f":
+  type "i": integer, the payload holds it as decimal string;
+  type "s": index into "s";
+  type "l": list of indexes into "s".
+  null (or a missing trailing position) means the event has no such field. If the
+  last element is an object instead, its keys are additional fields as is.
+- The key of an event in "epg" is its START as string.
+
+pack() returns the document as compact JSON, or with compress=True as
+"z:" + base64 of the zlib compressed JSON. A browser decodes the latter with
+atob() and DecompressionStream("deflate") before JSON.parse().
+"""
+import base64
+import json
+import logging
+import zlib
+
+_LOGGER = logging.getLogger(__name__)
+
+EPG_CODEC_VERSION = 1
+EPG_CODEC_COMPRESSED = "z:"
+
+FIELD_INT = "i"
+FIELD_STRING = "s"
+FIELD_LIST = "l"
+
+EVENT_FIELDS = (
+    ("START", FIELD_INT),
+    ("DURATION", FIELD_INT),
+    ("EVENTID", FIELD_INT),
+    ("TITLE", FIELD_STRING),
+    ("SUBTITLE", FIELD_STRING),
+    ("DESCRIPTION", FIELD_STRING),
+    ("GENRE", FIELD_STRING),
+    ("MINAGE", FIELD_STRING),
+    ("VPSTIME", FIELD_STRING),
+    ("STREAMDETAILS", FIELD_LIST),
+)
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def add(self, value):
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+
+def _encode_event(event, table, fields=EVENT_FIELDS):
+    row = []
+    extra = {}
+    known = set()
+    for name, kind in fields:
+        known.add(name)
+        value = event.get(name)
+        if value is None:
+            row.append(None)
+        elif kind == FIELD_INT:
+            if isinstance(value, str) and value.isdigit():
+                row.append(int(value))
+            else:
+                # not a plain number, keep it verbatim
+                row.append(None)
+                extra[name] = value
+        elif kind == FIELD_LIST:
+            row.append([table.add(item) for item in value])
+        else:
+            row.append(table.add(value))
+    for name, value in event.items():
+        if name not in known:
+            extra[name] = value
+    while row and row[-1] is None:
+        row.pop()
+    if extra:
+        row.extend([None] * (len(fields) - len(row)))
+        row.append(extra)
+    return row
+
+
+"""
+Encodes EPG payloads with one string table for all channels.
+:return dict (the document described above)
+"""
+
+
+def encode_channels(payloads, fields=EVENT_FIELDS):
+    table = _StringTable()
+    channels = []
+    for channelid, payload in payloads.items():
+        if payload is None:
+            continue
+        meta = {}
+        events = []
+        for key, value in payload.get("epg", {}).items():
+            if isinstance(value, dict):
+                events.append(_encode_event(value, table, fields))
+            else:
+                meta[key] = value
+        channels.append([channelid, payload.get("channeldata"), meta, events])
+    return {
+        "v": EPG_CODEC_VERSION,
+        "f": [list(field) for field in fields],
+        "s": table.strings,
+        "c": channels,
+    }
+
+
+"""
+Reference decoder, the inverse of encode_channels.
+:return dict channelid -> {"channeldata", "epg"}
+"""
+
+
+def decode_channels(doc):
+    if doc.get("v") != EPG_CODEC_VERSION:
+        raise ValueError("unsupported EPG encoding {}".format(doc.get("v")))
+    fields = doc["f"]
+    strings = doc["s"]
+    payloads = {}
+    for channelid, channeldata, meta, rows in doc["c"]:
+        epg = dict(meta)
+        for row in rows:
+            event = {}
+            for (name, kind), value in zip(fields, row):
+                if value is None or isinstance(value, dict):
+                    continue
+                if kind == FIELD_INT:
+                    event[name] = str(value)
+                elif kind == FIELD_LIST:
+                    event[name] = [strings[sid] for sid in value]
+                else:
+                    event[name] = strings[value]
+            if row and isinstance(row[-1], dict):
+                event.update(row[-1])
+            epg[event.get("START")] = event
+        payloads[channelid] = {"channeldata": channeldata, "epg": epg}
+    return payloads
+
+
+def pack(doc, compress=False, level=6):
+    data = json.dumps(doc, separators=(",", ":"), ensure_ascii=False)
+    if not compress:
+        return data
+    return EPG_CODEC_COMPRESSED + base64.b64encode(
+        zlib.compress(data.encode(), level)
+    ).decode("ascii")
+
+
+def unpack(data):
+    if data.startswith(EPG_CODEC_COMPRESSED):
+        data = zlib.decompress(base64.b64decode(data[len(EPG_CODEC_COMPRESSED) :]))
+    return json.loads(data)
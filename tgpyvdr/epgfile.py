@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import logging
+import mmap
+import os
+
+from .tgpyvdr import iter_epg_records
+
+_LOGGER = logging.getLogger(__name__)
+
+EPG_FILE_DEFAULT_PATH = "/var/cache/vdr/epg.data"
+EPG_FILE_ENCODING = "utf-8"
+
+
+class EpgFileRecord(object):
+    """
+    A line of epg.data ("<tag> <value>"), providing what parse_epg_records needs:
+    tag, raw_value and decode(raw). Values are sliced from the map on access.
+    """
+
+    __slots__ = ("_map", "_start", "_end", "_encoding")
+
+    def __init__(self, buf, start, end, encoding=EPG_FILE_ENCODING):
+        self._map = buf
+        self._start = start
+        self._end = end
+        self._encoding = encoding
+
+    @property
+    def tag(self):
+        return self._map[self._start]
+
+    @property
+    def raw_value(self):
+        return self._map[self._start + 2 : self._end]
+
+    def decode(self, raw):
+        return str(raw, self._encoding, "replace")
+
+
+"""
+Splits the content of epg.data into records, lazily.
+:return iterator of EpgFileRecord
+"""
+
+
+def iter_file_records(buf, encoding=EPG_FILE_ENCODING):
+    find = buf.find
+    end = len(buf)
+    pos = 0
+    while pos < end:
+        nl = find(b"\n", pos)
+        if nl < 0:
+            nl = end
+        stop = nl
+        if stop > pos and buf[stop - 1] == 0x0D:
+            stop -= 1
+        if stop > pos:
+            yield EpgFileRecord(buf, pos, stop, encoding)
+        pos = nl + 1
+
+
+class EpgFile(object):
+    """
+    VDR's own EPG dump (epg.data) as EPG source for a VDR on the same host or a
+    shared filesystem. The file is memory mapped and parsed with the LSTE record
+    parser; it is only read again when inode, mtime or size changed.
+    VDR rewrites the file every few minutes (and on shutdown), so the guide is as
+    old as the last dump.
+    """
+
+    def __init__(self, path=EPG_FILE_DEFAULT_PATH, encoding=EPG_FILE_ENCODING):
+        self.path = path
+        self.encoding = encoding
+        self.stamp = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            _LOGGER.debug("EPG file %s not accessible: %s", self.path, e)
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def available(self):
+        return self._stat() is not None
+
+    def changed(self):
+        """True if the file differs from the one read last."""
+        stamp = self._stat()
+        return stamp is not None and stamp != self.stamp
+
+    """
+    Parses the file, restricted to the given channel ids if any.
+    :return dict channelid -> {"channelid", "channelname", <start>: event},
+            None if the file can not be read
+    """
+
+    def read(self, channels=None):
+        if channels is not None:
+            channels = set(channels)
+        epg = {}
+        try:
+            with open(self.path, "rb") as f:
+                # stamp of the file actually opened, VDR replaces it on each dump
+                st = os.fstat(f.fileno())
+                stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if stamp[2] == 0:
+                    self.stamp = stamp
+                    return epg
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    for channelid, channel in iter_epg_records(
+                        iter_file_records(buf, self.encoding)
+                    ):
+                        if channels is None or channelid in channels:
+                            epg[channelid] = channel
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Unable to read EPG file %s: %s", self.path, e)
+            return None
+        self.stamp = stamp
+        _LOGGER.debug("Read %d channels from %s", len(epg), self.path)
+        return epg
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+
+_LOGGER = logging.getLogger(__name__)
+
+GRID_FIELDS = ("TITLE", "SUBTITLE")
+
+
+class _StringTable(object):
+    """
+    Strings of the text columns. Append only, so published columns stay valid
+    while new ones are built; replaced by a compacted table once the strings
+    dropped since the last compaction outnumber the ones still used.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+        # strings in use after the last compaction
+        self.live = 0
+
+    def add(self, value):
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+    def needs_compaction(self):
+        return len(self.strings) > 2 * self.live + 1024
+
+
+class _Columns(object):
+    """
+    One published state of the grid, never changed once built.
+    Events are sorted by (channel, start) into typed arrays (start, duration,
+    channel index, event id) plus per field offsets into the string table;
+    each channel owns the slice offsets[c]:offsets[c + 1] of the event columns.
+    """
+
+    def __init__(self, fields, table):
+        self.channels = []
+        self.channel_index = {}
+        # events dict each channel was built from
+        self.sources = []
+        self.offsets = array("l", [0])
+        self.start = array("q")
+        self.duration = array("l")
+        self.channel = array("l")
+        self.eventid = array("q")
+        self.table = table
+        self.strings = table.strings
+        self.text = {field: array("l") for field in fields}
+        # longest event per channel, bounds how far back a window has to look
+        self.max_duration = array("l")
+
+    def __len__(self):
+        return len(self.start)
+
+    def _add_channel(self, channelid, source, longest):
+        index = len(self.channels)
+        self.channel_index[channelid] = index
+        self.channels.append(channelid)
+        self.sources.append(source)
+        self.max_duration.append(longest)
+        count = len(self.start) - len(self.channel)
+        self.channel.extend(array("l", [index]) * count)
+        self.offsets.append(len(self.start))
+
+    def add_events(self, channelid, events):
+        longest = 0
+        rows = sorted(
+            (int(start), event)
+            for start, event in events.items()
+            if isinstance(event, dict)
+        )
+        table = self.table
+        for begin, event in rows:
+            duration = int(event.get("DURATION") or 0)
+            longest = max(longest, duration)
+            self.start.append(begin)
+            self.duration.append(duration)
+            self.eventid.append(int(event.get("EVENTID") or 0))
+            for field, text in self.text.items():
+                text.append(table.add(event.get(field) or ""))
+        self._add_channel(channelid, events, longest)
+
+    def copy_rows(self, other, index, rows, source):
+        # rows: slice of the other columns or list of row numbers
+        if isinstance(rows, slice):
+            self.start.extend(other.start[rows])
+            self.duration.extend(other.duration[rows])
+            self.eventid.extend(other.eventid[rows])
+            for field, text in self.text.items():
+                text.extend(other.text[field][rows])
+        else:
+            for row in rows:
+                self.start.append(other.start[row])
+                self.duration.append(other.duration[row])
+                self.eventid.append(other.eventid[row])
+                for field, text in self.text.items():
+                    text.append(other.text[field][row])
+        self._add_channel(other.channels[index], source, other.max_duration[index])
+
+    """
+    Rows of a channel that are still in its events dict, for events the store
+    deleted in place (eviction, size budget). Expired events are at the front,
+    so usually this is a single slice. Keys of the store are the starts as text.
+    :return slice or list of row numbers
+    """
+
+    def retained(self, index, events):
+        lo = self.offsets[index]
+        hi = self.offsets[index + 1]
+        start = self.start
+        first = lo
+        while first < hi and str(start[first]) not in events:
+            first += 1
+        if hi - first == len(events):
+            return slice(first, hi)
+        return [row for row in range(first, hi) if str(start[row]) in events]
+
+    def compacted(self, fields):
+        table = _StringTable()
+        columns = _Columns(fields, table)
+        columns.channels = self.channels
+        columns.channel_index = self.channel_index
+        columns.sources = self.sources
+        columns.offsets = self.offsets
+        columns.start = self.start
+        columns.duration = self.duration
+        columns.channel = self.channel
+        columns.eventid = self.eventid
+        columns.max_duration = self.max_duration
+        strings = self.strings
+        for field, text in self.text.items():
+            columns.text[field] = array("l", (table.add(strings[sid]) for sid in text))
+        table.live = len(table.strings)
+        return columns
+
+
+class EpgGrid(object):
+    """
+    Column store of the guide for time window queries across many channels
+    (see _Columns). A window query bisects the start column of each selected
+    channel, so it costs O(channels * log events) plus the size of the result.
+    The grid is kept up to date by the thread that owns the EPG store, like the
+    search index: changed channels are encoded again, all others are copied over
+    as array slices into the next columns, which then replace the published ones.
+    Queries work on the columns published when they started, from any thread.
+    """
+
+    def __init__(self, fields=GRID_FIELDS):
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._table = _StringTable()
+        self._columns = _Columns(fields, self._table)
+
+    def __len__(self):
+        return len(self._columns)
+
+    @property
+    def channels(self):
+        return list(self._columns.channels)
+
+    """
+    Builds the grid from {channelid: {start: event}} as returned by
+    get_channel_epg_info (or the events of an EpgStore).
+    :return EpgGrid
+    """
+
+    @classmethod
+    def from_epg(cls, epg, fields=GRID_FIELDS):
+        grid = cls(fields)
+        grid.update(epg)
+        return grid
+
+    def update_channel(self, channelid, events):
+        self.update({channelid: events})
+
+    """
+    Takes the current events of the changed channels ({channelid: events},
+    None removes a channel). If the events are the same dict as last time, the
+    store only deleted events from it and the rows are cut down instead of
+    encoded again.
+    """
+
+    def update(self, changes):
+        with self._lock:
+            current = self._columns
+            columns = _Columns(self.fields, self._table)
+            for index, channelid in enumerate(current.channels):
+                if channelid not in changes:
+                    rows = slice(current.offsets[index], current.offsets[index + 1])
+                    columns.copy_rows(current, index, rows, current.sources[index])
+                    continue
+                events = changes[channelid]
+                if events is None:
+                    continue
+                if events is current.sources[index]:
+                    rows = current.retained(index, events)
+                    columns.copy_rows(current, index, rows, events)
+                else:
+                    columns.add_events(channelid, events)
+            for channelid, events in changes.items():
+                if events is not None and channelid not in columns.channel_index:
+                    columns.add_events(channelid, events)
+            if self._table.needs_compaction():
+                columns = columns.compacted(self.fields)
+                self._table = columns.table
+            self._columns = columns
+
+    """
+    Row numbers of all events intersecting [t1, t2) on the given channels
+    (channelids, default all), grouped by channel and ordered by start.
+    :return (columns, array of row numbers), see rows()
+    """
+
+    def window(self, t1, t2, channels=None):
+        columns = self._columns
+        if channels is None:
+            indexes = range(len(columns.channels))
+        else:
+            indexes = [
+                columns.channel_index[c] for c in channels if c in columns.channel_index
+            ]
+        rows = array("l")
+        start = columns.start
+        duration = columns.duration
+        for index in indexes:
+            lo = columns.offsets[index]
+            hi = columns.offsets[index + 1]
+            if lo == hi:
+                continue
+            first = bisect_left(start, t1 - columns.max_duration[index], lo, hi)
+            last = bisect_left(start, t2, first, hi)
+            for row in range(first, last):
+                if start[row] + duration[row] > t1:
+                    rows.append(row)
+        return columns, rows
+
+    def row(self, columns, row):
+        event = {
+            "channelid": columns.channels[columns.channel[row]],
+            "START": columns.start[row],
+            "DURATION": columns.duration[row],
+            "EVENTID": columns.eventid[row],
+        }
+        for field, text in columns.text.items():
+            event[field] = columns.strings[text[row]]
+        return event
+
+    def rows(self, window):
+        columns, rows = window
+        return [self.row(columns, row) for row in rows]
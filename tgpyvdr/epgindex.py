@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import logging
+import re
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+INDEXED_FIELDS = ("TITLE", "SUBTITLE", "DESCRIPTION")
+
+# EN 300 468 content descriptor, upper nibble of the first byte
+GENRE_GROUPS = {
+    0x1: "movie",
+    0x2: "news",
+    0x3: "show",
+    0x4: "sports",
+    0x5: "children",
+    0x6: "music",
+    0x7: "arts",
+    0x8: "social",
+    0x9: "education",
+    0xA: "leisure",
+    0xB: "special",
+}
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN.findall(text.casefold())
+
+
+"""
+Facets of a VDR genre record ("G 10 14"): the raw codes and the genre group names.
+:return set of str
+"""
+
+
+def genre_facets(genre):
+    facets = set()
+    for code in (genre or "").split():
+        try:
+            value = int(code, 16)
+        except ValueError:
+            continue
+        facets.add(code.lower())
+        group = GENRE_GROUPS.get(value >> 4)
+        if group:
+            facets.add(group)
+    return facets
+
+
+class EpgSearchIndex(object):
+    """
+    Inverted index over the EPG: case folded tokens of title, subtitle and
+    description plus genre facets, each mapping to a set of (channelid, start) keys.
+    Channels are re-indexed incrementally, unchanged event objects are skipped.
+    """
+
+    def __init__(self, fields=INDEXED_FIELDS):
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._facets = {}
+        # channelid -> {start: (event, tokens, facets)}
+        self._channels = {}
+
+    def __len__(self):
+        return sum(len(c) for c in self._channels.values())
+
+    def _add(self, index, terms, key):
+        for term in terms:
+            keys = index.get(term)
+            if keys is None:
+                keys = index[term] = set()
+            keys.add(key)
+
+    def _discard(self, index, terms, key):
+        for term in terms:
+            keys = index.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[term]
+
+    def update_channel(self, channelid, events):
+        events = events or {}
+        with self._lock:
+            docs = self._channels.setdefault(channelid, {})
+            for start in [s for s in docs if events.get(s) is not docs[s][0]]:
+                _, tokens, facets = docs.pop(start)
+                self._discard(self._postings, tokens, (channelid, start))
+                self._discard(self._facets, facets, (channelid, start))
+            for start, event in events.items():
+                if start in docs or not isinstance(event, dict):
+                    continue
+                tokens = set()
+                for field in self.fields:
+                    tokens.update(tokenize(event.get(field)))
+                facets = genre_facets(event.get("GENRE"))
+                docs[start] = (event, tokens, facets)
+                self._add(self._postings, tokens, (channelid, start))
+                self._add(self._facets, facets, (channelid, start))
+            if not docs:
+                del self._channels[channelid]
+
+    def remove_channel(self, channelid):
+        self.update_channel(channelid, None)
+
+    """
+    Finds events containing all words of query (and any of genres) that intersect
+    [start, end) on the given channels.
+    :return list of (channelid, start) sorted by start time
+    """
+
+    def search(self, query="", start=None, end=None, channels=None, genres=None, limit=None):
+        terms = tokenize(query)
+        with self._lock:
+            candidates = None
+            for term in sorted(terms, key=lambda t: len(self._postings.get(t, ()))):
+                keys = self._postings.get(term)
+                if not keys:
+                    return []
+                candidates = set(keys) if candidates is None else candidates & keys
+                if not candidates:
+                    return []
+            if genres:
+                facet_keys = set()
+                for genre in genres:
+                    facet_keys.update(self._facets.get(str(genre).casefold(), ()))
+                candidates = (
+                    facet_keys if candidates is None else candidates & facet_keys
+                )
+            if candidates is None:
+                candidates = {
+                    (channelid, s)
+                    for channelid, docs in self._channels.items()
+                    for s in docs
+                }
+            if channels:
+                channels = set(channels)
+                candidates = {key for key in candidates if key[0] in channels}
+            result = []
+            for key in candidates:
+                event = self._channels[key[0]][key[1]][0]
+                begin = int(key[1])
+                if end is not None and begin >= end:
+                    continue
+                if start is not None and begin + int(event.get("DURATION") or 0) <= start:
+                    continue
+                result.append(key)
+        result.sort(key=lambda key: (int(key[1]), key[0]))
+        return result[:limit] if limit else result
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+EPGSEARCH_PLUGIN = "epgsearch"
+# reply codes of epgsearch's SVDRP commands
+EPGSEARCH_OK = 900
+EPGSEARCH_NO_RESULTS = 901
+# reply code of VDR's plugin list (PLUG without arguments)
+PLUGIN_LIST = 214
+
+SEARCH_MODE_PHRASE = 0
+SEARCH_MODE_ALL_WORDS = 1
+SEARCH_MODE_ANY_WORD = 2
+SEARCH_MODE_EXACT = 3
+SEARCH_MODE_REGEX = 4
+
+# timer flag of a search result
+SEARCH_TIMER_NONE = 0
+SEARCH_TIMER_PARTIAL = 1
+SEARCH_TIMER_COMPLETE = 2
+
+
+def _escape(value):
+    # epgsearch.conf notation: "|" stands for ":" in text fields
+    return value.replace("|", "!^pipe^!").replace(":", "|")
+
+
+def _unescape(value):
+    return value.replace("|", ":").replace("!^pipe^!", "|")
+
+
+def _flag(value):
+    return "1" if value else "0"
+
+
+"""
+Builds the search settings of an ad hoc search (the leading fields of an
+epgsearch.conf line, epgsearch fills in the defaults for the rest):
+id:term:use time:start:stop:use channel:channels:match case:mode:title:subtitle:description
+:return str
+"""
+
+
+def search_settings(
+    query,
+    mode=SEARCH_MODE_ALL_WORDS,
+    title=True,
+    subtitle=True,
+    description=True,
+    match_case=False,
+):
+    fields = [
+        "0",
+        _escape(query),
+        "0",
+        "",
+        "",
+        "0",
+        "",
+        _flag(match_case),
+        str(mode),
+        _flag(title),
+        _flag(subtitle),
+        _flag(description),
+    ]
+    return ":".join(fields)
+
+
+def search_command(settings):
+    return f"PLUG {EPGSEARCH_PLUGIN} QRYS {settings}"
+
+
+def conflicts_command(relevant=False):
+    return f"PLUG {EPGSEARCH_PLUGIN} LSCC" + (" REL" if relevant else "")
+
+
+"""
+Names of the plugins in the reply of PLUG ("214-epgsearch v2.4.1 - search the EPG ...").
+:return set of lower case names
+"""
+
+
+def parse_plugins(lines):
+    plugins = set()
+    for line in lines or ():
+        if line.code != PLUGIN_LIST or not line.Value:
+            continue
+        name = line.Value.split(None, 1)[0]
+        # the first line is "Available plugins:"
+        if not name.endswith(":"):
+            plugins.add(name.lower())
+    return plugins
+
+
+"""
+Parses a result line of QRYS:
+search id:event id:title:subtitle:begin:end:channel:timer start:timer stop:timer file:timer flag
+channel is the channel number (channel id with newer versions), numbers maps
+numbers to channel ids.
+:return dict or None
+"""
+
+
+def parse_search_result(value, numbers=None):
+    fields = value.split(":")
+    if len(fields) < 7:
+        return None
+    try:
+        begin = int(fields[4])
+        end = int(fields[5])
+    except ValueError:
+        return None
+    channel = fields[6]
+    if "-" in channel:
+        channelid = channel
+    else:
+        channelid = (numbers or {}).get(channel)
+    timer = fields[10] if len(fields) > 10 else ""
+    return {
+        "channelid": channelid,
+        "channel": channel,
+        "start": begin,
+        "duration": max(end - begin, 0),
+        "eventid": fields[1],
+        "title": _unescape(fields[2]),
+        "subtitle": _unescape(fields[3]),
+        "timer": int(timer) if timer.isdigit() else SEARCH_TIMER_NONE,
+    }
+
+
+"""
+Parses a line of LSCC: the conflict time followed by the conflicting timers,
+each as timer id|percent recorded|concurrent timer ids joined by "#":
+1190232780:152|30|50#152#45:45|10|50#152#45
+:return {"start", "timers": [id], "recorded": {id: percent}, "concurrent": [id]} or None
+"""
+
+
+def parse_conflict(value):
+    fields = value.split(":")
+    if len(fields) < 2 or not fields[0].isdigit():
+        return None
+    conflict = {"start": int(fields[0]), "timers": [], "recorded": {}}
+    concurrent = []
+    for part in fields[1:]:
+        items = part.split("|")
+        if not items[0]:
+            continue
+        conflict["timers"].append(items[0])
+        if len(items) > 1 and items[1].isdigit():
+            conflict["recorded"][items[0]] = int(items[1])
+        if len(items) > 2:
+            for id in items[2].split("#"):
+                if id and id not in concurrent:
+                    concurrent.append(id)
+    conflict["concurrent"] = concurrent
+    return conflict
+
+
+"""
+Checks the reply of an epgsearch command.
+:return list of the value of each data line, [] if nothing was found,
+        None if the reply is missing or an error
+"""
+
+
+def reply_values(lines):
+    if not lines:
+        return None
+    code = lines[-1].code
+    if code == EPGSEARCH_NO_RESULTS:
+        return []
+    if code != EPGSEARCH_OK:
+        _LOGGER.debug("epgsearch replied %s", lines[-1])
+        return None
+    return [line.Value for line in lines if line.code == EPGSEARCH_OK]
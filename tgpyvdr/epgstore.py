@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+import heapq
+import logging
+import time
+
+from .epgbodies import EventBodies
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PAST_SECONDS = 2 * 3600
+
+
+def event_start(event):
+    return int(event["START"])
+
+
+def event_end(event):
+    return int(event["START"]) + int(event.get("DURATION") or 0)
+
+
+def event_size(event):
+    """Rough payload size of an event (characters of keys and values)."""
+    size = 0
+    for key, value in event.items():
+        size += len(key)
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, list):
+            for item in value:
+                size += len(item)
+    return size
+
+
+"""
+Splits the parsed EPG of a channel into its meta data (channelid, channelname)
+and the events within [lower, upper], at most max_events, ordered by start.
+:return (meta, events)
+"""
+
+
+def retain_events(events, lower=None, upper=None, max_events=None):
+    meta = {}
+    starts = []
+    for key, value in (events or {}).items():
+        if isinstance(value, dict):
+            starts.append(key)
+        else:
+            meta[key] = value
+
+    kept = {}
+    for start in sorted(starts, key=int):
+        event = events[start]
+        if upper is not None and int(start) > upper:
+            break
+        if lower is not None and event_end(event) < lower:
+            continue
+        kept[start] = event
+        if max_events and len(kept) >= max_events:
+            break
+    return meta, kept
+
+
+class EpgStore(object):
+    """
+    Holds the EPG of all channels with a retention policy:
+    events that ended more than `past` seconds ago are evicted, events starting
+    later than `future` seconds from now are not kept, each channel keeps at most
+    `max_events` events and all channels together at most `max_size` characters.
+    Expired events are found through a heap ordered by end time, so eviction only
+    touches what actually expires. With `dedup` event bodies are shared across
+    channels (see EventBodies), sizes are still counted per event.
+    """
+
+    def __init__(
+        self,
+        past=DEFAULT_PAST_SECONDS,
+        future=None,
+        max_events=None,
+        max_size=None,
+        clock=time.time,
+        dedup=True,
+    ):
+        self.past = past
+        self.future = future
+        self.max_events = max_events
+        self.max_size = max_size
+        self.clock = clock
+        # channelid -> {"channeldata": {...}, "meta": {...}, "epg": {start: event}}
+        self.channels = {}
+        self._sizes = {}
+        self._size = 0
+        self._count = 0
+        # bumped on every change of the stored events
+        self.version = 0
+        # (end, channelid, start) of every stored event, stale entries are skipped
+        self._expiry = []
+        self.bodies = EventBodies() if dedup else None
+
+    def __contains__(self, channelid):
+        return channelid in self.channels
+
+    def __len__(self):
+        return len(self.channels)
+
+    def size(self):
+        return self._size
+
+    def event_count(self):
+        return self._count
+
+    def get_channel(self, channelid):
+        return self.channels.get(channelid)
+
+    def window(self, now=None):
+        if now is None:
+            now = self.clock()
+        lower = now - self.past if self.past is not None else None
+        upper = now + self.future if self.future is not None else None
+        return lower, upper
+
+    """
+    Replaces the events of a channel, applying the retention window and
+    the per channel cap.
+    :return set of channelids changed by the budget enforcement (incl. this one)
+    """
+
+    def update_channel(self, channelid, channeldata, events, now=None):
+        lower, upper = self.window(now)
+        meta, kept = retain_events(events, lower, upper, self.max_events)
+
+        size = 0
+        for start, event in kept.items():
+            if self.bodies is not None:
+                self.bodies.intern(event)
+            size += event_size(event)
+            heapq.heappush(self._expiry, (event_end(event), channelid, start))
+
+        self.remove_channel(channelid)
+        self._size += size
+        self._sizes[channelid] = size
+        self._count += len(kept)
+        self.channels[channelid] = {
+            "channeldata": channeldata,
+            "meta": meta,
+            "epg": kept,
+        }
+        self._compact()
+        self.version += 1
+
+        changed = {channelid}
+        changed.update(self._enforce_size())
+        return changed
+
+    def remove_channel(self, channelid):
+        channel = self.channels.pop(channelid, None)
+        if channel is not None:
+            self._size -= self._sizes.pop(channelid, 0)
+            self._count -= len(channel["epg"])
+            for event in channel["epg"].values():
+                self._release(event)
+            self.version += 1
+
+    """
+    Drops all channels that are not in channelids.
+    :return set of removed channelids
+    """
+
+    def retain_channels(self, channelids):
+        removed = set(self.channels) - set(channelids)
+        for channelid in removed:
+            self.remove_channel(channelid)
+        return removed
+
+    """
+    Removes all events that ended before the retention window.
+    :return set of channelids that lost events
+    """
+
+    def evict(self, now=None):
+        if self.past is None:
+            return set()
+        if now is None:
+            now = self.clock()
+        lower = now - self.past
+        changed = set()
+        expiry = self._expiry
+        while expiry and expiry[0][0] < lower:
+            end, channelid, start = heapq.heappop(expiry)
+            channel = self.channels.get(channelid)
+            if channel is None:
+                continue
+            event = channel["epg"].get(start)
+            if event is None or event_end(event) != end:
+                continue
+            del channel["epg"][start]
+            self._release(event)
+            size = event_size(event)
+            self._sizes[channelid] -= size
+            self._size -= size
+            self._count -= 1
+            changed.add(channelid)
+        if changed:
+            self.version += 1
+            _LOGGER.debug("Evicted expired events of %d channels", len(changed))
+        return changed
+
+    def _enforce_size(self):
+        changed = set()
+        if not self.max_size or self._size <= self.max_size:
+            return changed
+        # drop the events furthest in the future first
+        latest = [
+            (-int(next(reversed(c["epg"]))), channelid)
+            for channelid, c in self.channels.items()
+            if c["epg"]
+        ]
+        heapq.heapify(latest)
+        while latest and self._size > self.max_size:
+            _, channelid = heapq.heappop(latest)
+            epg = self.channels[channelid]["epg"]
+            start, event = epg.popitem()
+            self._release(event)
+            size = event_size(event)
+            self._sizes[channelid] -= size
+            self._size -= size
+            self._count -= 1
+            changed.add(channelid)
+            if epg:
+                heapq.heappush(latest, (-int(next(reversed(epg))), channelid))
+        self.version += 1
+        _LOGGER.debug("EPG size budget trimmed %d channels", len(changed))
+        return changed
+
+    def _release(self, event):
+        if self.bodies is not None:
+            self.bodies.release(event)
+
+    """
+    Size of the store and, with dedup, how much the shared bodies save.
+    :return dict
+    """
+
+    def stats(self):
+        stats = {
+            "channels": len(self.channels),
+            "events": self._count,
+            "size": self._size,
+        }
+        if self.bodies is not None:
+            stats["dedup"] = self.bodies.stats()
+        return stats
+
+    def _compact(self):
+        # stale heap entries pile up when channels are replaced, rebuild if needed
+        if len(self._expiry) <= 2 * self._count + 1024:
+            return
+        self._expiry = [
+            (event_end(event), channelid, start)
+            for channelid, c in self.channels.items()
+            for start, event in c["epg"].items()
+        ]
+        heapq.heapify(self._expiry)
+
+    """
+    Builds the serializable view of a channel as delivered to the frontend.
+    :return {"channeldata": {...}, "epg": {"channelid", "channelname", <start>: event}}
+    """
+
+    def channel_payload(self, channelid):
+        channel = self.channels.get(channelid)
+        if channel is None:
+            return None
+        epg = dict(channel["meta"])
+        epg.update(channel["epg"])
+        return {"channeldata": channel["channeldata"], "epg": epg}
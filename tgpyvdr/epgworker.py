@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ..tgsvdrp.tgsvdrp import split_lines
+from .epgstore import retain_events
+from .tgpyvdr import EPG_DATA_RECORD
+from .tgpyvdr import parse_epg_records
+
+_LOGGER = logging.getLogger(__name__)
+
+# bytes of LSTE replies handed to a worker at once
+EPG_CHUNK_SIZE = 2 * 1024 * 1024
+
+
+"""
+Worker side: parses complete channels of LSTE replies, applies the retention window
+and serializes each channel the way the EPG sensor publishes it.
+channeldata maps channelids to the "channeldata" part of the payload.
+:return dict channelid -> (meta, events, payload as JSON)
+"""
+
+
+def parse_chunk(raw, encoding, channeldata, lower=None, upper=None, max_events=None):
+    epg = parse_epg_records(
+        line for line in split_lines(raw, encoding) if line.code == EPG_DATA_RECORD
+    )
+    result = {}
+    for channelid, events in epg.items():
+        meta, kept = retain_events(events, lower, upper, max_events)
+        data = channeldata.get(channelid)
+        if data is None:
+            continue
+        payload = dict(meta)
+        payload.update(kept)
+        result[channelid] = (
+            meta,
+            kept,
+            json.dumps({"channeldata": data, "epg": payload}),
+        )
+    return result
+
+
+class EpgWorkerPool(object):
+    """
+    Parses and pre-serializes the LSTE replies of many channels in a pool of worker
+    processes, so large guides use several cores outside of the GIL of the calling
+    process. Replies are batched into chunks of about `chunk_size` bytes that are
+    parsed while the following channels are still being fetched.
+    Processes are spawned, never forked from the (threaded) caller.
+    """
+
+    def __init__(self, workers=2, chunk_size=EPG_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    """
+    pieces yields (channelid, raw LSTE reply, encoding) with complete channels,
+    e.g. PYVDR.iter_epg_raw.
+    :return dict channelid -> (meta, events, payload as JSON), see parse_chunk
+    """
+
+    def parse(self, pieces, channeldata, lower=None, upper=None, max_events=None):
+        executor = self._get_executor()
+        futures = []
+        batch = []
+        size = 0
+
+        def submit(encoding):
+            futures.append(
+                executor.submit(
+                    parse_chunk,
+                    b"".join(raw for _, raw in batch),
+                    encoding,
+                    {c: channeldata[c] for c, _ in batch if c in channeldata},
+                    lower,
+                    upper,
+                    max_events,
+                )
+            )
+
+        encoding = None
+        for channelid, raw, piece_encoding in pieces:
+            if batch and (piece_encoding != encoding or size >= self.chunk_size):
+                submit(encoding)
+                batch = []
+                size = 0
+            encoding = piece_encoding
+            batch.append((channelid, bytes(raw)))
+            size += len(raw)
+        if batch:
+            submit(encoding)
+        _LOGGER.debug("Parsing the EPG in %d chunks", len(futures))
+        result = {}
+        for future in futures:
+            result.update(future.result())
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import logging
+import time
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import datetime
+from datetime import timedelta
+
+from .tgpyvdr import FLAG_TIMER_ACTIVE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class IntervalIndex(object):
+    """
+    Static interval tree over half open intervals [start, end).
+    The intervals are sorted by start and the sorted array is used as an implicit
+    balanced tree whose nodes carry the maximum end of their subtree, so an overlap
+    query costs O(log n + k).
+    """
+
+    def __init__(self, items=()):
+        items = sorted(items, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.payloads = [item[2] for item in items]
+        self._max_end = list(self.ends)
+        self._build(0, len(items))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self.ends[mid]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > max_end:
+                max_end = child
+        self._max_end[mid] = max_end
+        return max_end
+
+    """
+    All payloads whose interval intersects [t1, t2)
+    :return list of payloads ordered by start
+    """
+
+    def overlapping(self, t1, t2):
+        result = []
+        self._query(0, len(self.starts), t1, t2, result)
+        return result
+
+    def _query(self, lo, hi, t1, t2, result):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= t1:
+            return
+        self._query(lo, mid, t1, t2, result)
+        # everything right of mid starts even later
+        if self.starts[mid] >= t2:
+            return
+        if self.ends[mid] > t1:
+            result.append(self.payloads[mid])
+        self._query(mid + 1, hi, t1, t2, result)
+
+
+class ConcurrencyProfile(object):
+    """
+    Step function of concurrently active intervals built by a sweep line, with a
+    sparse table for O(1) range maximum queries.
+    key(payload) groups intervals, the load is the number of distinct active groups
+    (default: every interval is its own group).
+    """
+
+    def __init__(self, items=(), key=None):
+        bounds = []
+        for start, end, payload in items:
+            if end > start:
+                bounds.append((start, 1, payload))
+                bounds.append((end, -1, payload))
+        # ends sort before starts at the same time, [a, b) and [b, c) do not overlap
+        bounds.sort(key=lambda bound: (bound[0], bound[1]))
+
+        self.times = []
+        self.loads = []
+        self.active = []
+        refs = {}
+        active = set()
+        for index, (at, delta, payload) in enumerate(bounds):
+            group = key(payload) if key is not None else payload
+            count = refs.get(group, 0) + delta
+            if count:
+                refs[group] = count
+            else:
+                refs.pop(group, None)
+            if delta > 0:
+                active.add(payload)
+            else:
+                active.discard(payload)
+            if index + 1 < len(bounds) and bounds[index + 1][0] == at:
+                continue
+            self.times.append(at)
+            self.loads.append(len(refs))
+            self.active.append(tuple(active))
+        self._table = [self.loads]
+        width = 1
+        while 2 * width <= len(self.loads):
+            prev = self._table[-1]
+            self._table.append(
+                [max(prev[i], prev[i + width]) for i in range(len(prev) - width)]
+            )
+            width *= 2
+
+    """
+    Highest load within [t1, t2)
+    :return int
+    """
+
+    def peak(self, t1, t2):
+        lo = max(bisect_right(self.times, t1) - 1, 0)
+        hi = bisect_left(self.times, t2) - 1
+        if hi < lo or not self.times:
+            return 0
+        level = (hi - lo + 1).bit_length() - 1
+        row = self._table[level]
+        return max(row[lo], row[hi - (1 << level) + 1])
+
+    """
+    Segments where the load exceeds limit
+    :return list of (start, end, load, payloads)
+    """
+
+    def above(self, limit):
+        segments = []
+        for index, load in enumerate(self.loads):
+            if load > limit and index + 1 < len(self.times):
+                segments.append(
+                    (self.times[index], self.times[index + 1], load, self.active[index])
+                )
+        return segments
+
+
+def transponder_of(channel_id):
+    # <source>-<nid>-<tid>-<sid>[-<rid>], channels of one transponder share a tuner
+    parts = (channel_id or "").split("-")
+    if len(parts) < 4:
+        return channel_id
+    return "-".join(parts[:3])
+
+
+"""
+Start and stop of a parsed timer as unix timestamps (VDR local time),
+a stop before the start belongs to the next day.
+:return (start, stop) or None
+"""
+
+
+def timer_interval(timer):
+    try:
+        day = datetime.strptime(timer["date"], "%Y-%m-%d")
+        start = day + timedelta(
+            hours=int(timer["start"][:-2] or 0), minutes=int(timer["start"][-2:])
+        )
+        stop = day + timedelta(
+            hours=int(timer["end"][:-2] or 0), minutes=int(timer["end"][-2:])
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+    if stop <= start:
+        stop += timedelta(days=1)
+    return int(time.mktime(start.timetuple())), int(time.mktime(stop.timetuple()))
+
+
+class TimerSchedule(object):
+    """
+    Interval index over the active timers of a LSTT result, answering overlap,
+    concurrency and tuner conflict queries.
+    channels (result of PYVDR.get_channels) maps timer channel numbers to transponders.
+    """
+
+    def __init__(self, timers, channels=None, tuners=1):
+        self.tuners = tuners
+        numbers = {
+            c.get("number"): c.get("id") for c in channels or () if c.get("id")
+        }
+        items = []
+        transponders = {}
+        for index, timer in enumerate(timers or ()):
+            if not timer or not int(timer.get("status") or 0) & FLAG_TIMER_ACTIVE:
+                continue
+            interval = timer_interval(timer)
+            if interval is None:
+                continue
+            channel = timer.get("channel")
+            items.append((interval[0], interval[1], index))
+            transponders[index] = transponder_of(numbers.get(channel, channel))
+        self.timers = timers
+        self.index = IntervalIndex(items)
+        self.recordings = ConcurrencyProfile(items)
+        self.transponders = ConcurrencyProfile(
+            items, key=transponders.get
+        )
+
+    def overlapping(self, t1, t2):
+        return [self.timers[index] for index in self.index.overlapping(t1, t2)]
+
+    def peak_recordings(self, t1, t2):
+        return self.recordings.peak(t1, t2)
+
+    def peak_tuners(self, t1, t2):
+        return self.transponders.peak(t1, t2)
+
+    """
+    Time ranges that need more tuners than available
+    :return list of dicts (start, stop, tuners, timers)
+    """
+
+    def conflicts(self, tuners=None):
+        if tuners is None:
+            tuners = self.tuners
+        return [
+            {
+                "start": start,
+                "stop": stop,
+                "tuners": load,
+                "timers": [
+                    self.timers[index].get("timerid") or self.timers[index].get("name")
+                    for index in sorted(active)
+                ],
+            }
+            for start, stop, load, active in self.transponders.above(tuners)
+        ]
+
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import logging
+import time
+from bisect import bisect_right
+
+from .intervals import timer_interval
+from .timers import FLAG_TIMER_ACTIVE
+from .timers import FLAG_TIMER_INSTANT_RECORDING
+from .timers import FLAG_TIMER_RECORDING
+
+_LOGGER = logging.getLogger(__name__)
+
+# seconds after a timer start/stop VDR is given to follow the schedule
+RECORDING_TRANSITION_MARGIN = 60
+# seconds between two looks at VDR when no transition is due
+RECORDING_RECONCILE_INTERVAL = 300
+
+
+def _flags(timer):
+    try:
+        return int(timer.get("status") or 0)
+    except ValueError:
+        return 0
+
+
+"""
+The timer VDR currently records, like PYVDR.is_recording: the first timer with
+the instant or the recording flag.
+:return copy of the timer with "instant" set, or None
+"""
+
+
+def recording_timer(timers):
+    for timer in timers or ():
+        if not timer:
+            continue
+        flags = _flags(timer)
+        if flags & FLAG_TIMER_INSTANT_RECORDING:
+            return dict(timer, instant=True)
+        if flags & FLAG_TIMER_RECORDING:
+            return dict(timer, instant=False)
+    return None
+
+
+class RecordingState(object):
+    """
+    Recording state derived from the cached timer list instead of a LSTT per poll.
+    The start and stop times of the active timers are the only moments the state
+    can change on its own, so VDR is only asked when one of them has passed since
+    the last answer, while VDR has not followed a recent one yet, and every
+    `reconcile` seconds to catch changes made elsewhere (instant recordings,
+    timers edited on the VDR).
+    Every LSTT result, whoever fetched it, is fed in through update_timers().
+    """
+
+    def __init__(
+        self,
+        margin=RECORDING_TRANSITION_MARGIN,
+        reconcile=RECORDING_RECONCILE_INTERVAL,
+        clock=time.time,
+    ):
+        self.margin = margin
+        self.reconcile = reconcile
+        self.clock = clock
+        self.timers = None
+        self.transitions = []
+        self.intervals = []
+        self.recording = None
+        self.confirmed = None
+        self.confirmations = 0
+
+    def update_timers(self, timers, now=None):
+        self.timers = timers or []
+        self.confirmed = self.clock() if now is None else now
+        self.confirmations += 1
+        self.recording = recording_timer(self.timers)
+        intervals = []
+        for timer in self.timers:
+            if not timer or not _flags(timer) & FLAG_TIMER_ACTIVE:
+                continue
+            interval = timer_interval(timer)
+            if interval is not None:
+                intervals.append(interval)
+        self.intervals = intervals
+        self.transitions = sorted(set(t for interval in intervals for t in interval))
+
+    def expected(self, now=None):
+        """True if an active timer covers now."""
+        now = self.clock() if now is None else now
+        return any(start <= now < stop for start, stop in self.intervals)
+
+    def needs_confirmation(self, now=None):
+        now = self.clock() if now is None else now
+        if self.timers is None or now - self.confirmed >= self.reconcile:
+            return True
+        # a start or stop passed since VDR was asked last
+        pos = bisect_right(self.transitions, self.confirmed)
+        if pos < len(self.transitions) and self.transitions[pos] <= now:
+            return True
+        # VDR did not follow the schedule yet, keep asking for a while
+        if (self.recording is not None) != self.expected(now):
+            pos = bisect_right(self.transitions, now)
+            return pos > 0 and now - self.transitions[pos - 1] <= self.margin
+        return False
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import logging
+import math
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RollingRefresh(object):
+    """
+    Spreads a full EPG pass over `interval` seconds instead of one burst.
+    The channel list is cut into shards of `shard_size` channels; every tick
+    refreshes only the shards needed to stay on schedule (none while the pass is
+    ahead of it), but stops when the tick's time budget is used up. The cursor
+    survives between ticks, so an interrupted tick simply continues on the next one.
+    """
+
+    def __init__(self, interval=3600, shard_size=10, budget=5.0, clock=time.monotonic):
+        self.interval = interval
+        self.shard_size = max(shard_size, 1)
+        self.budget = budget
+        self.clock = clock
+        self.channels = []
+        self.cursor = 0
+        self.pass_started = None
+        self.passes = 0
+        # last pass reported by completed()
+        self._completed = 0
+
+    def shard_count(self):
+        return max(math.ceil(len(self.channels) / self.shard_size), 1)
+
+    def needs_channels(self):
+        """True at the start of a pass, the caller should provide the channel list."""
+        if self.pass_started is None:
+            return True
+        return self.cursor >= len(self.channels) and self._pass_due()
+
+    def _pass_due(self):
+        return self.clock() - self.pass_started >= self.interval
+
+    def start_pass(self, channels):
+        self.channels = list(channels or ())
+        self.cursor = 0
+        self.pass_started = self.clock()
+        self.passes += 1
+        _LOGGER.debug(
+            "EPG pass %d: %d channels in %d shards",
+            self.passes,
+            len(self.channels),
+            self.shard_count(),
+        )
+
+    def pass_complete(self):
+        return self.pass_started is not None and self.cursor >= len(self.channels)
+
+    def completed(self):
+        """True once per pass, on the first call after its last shard."""
+        if not self.pass_complete() or self._completed == self.passes:
+            return False
+        self._completed = self.passes
+        return True
+
+    def _behind(self):
+        # shards that should be done by now to finish the pass within the interval
+        elapsed = self.clock() - self.pass_started
+        expected = math.ceil(self.shard_count() * min(elapsed / self.interval, 1.0))
+        done = self.cursor // self.shard_size
+        return max(expected - done, 0)
+
+    """
+    Yields the shards (lists of channels) due in this tick, the caller refreshes
+    each one before asking for the next. Stops when the budget is exhausted.
+    """
+
+    def due(self):
+        if self.pass_started is None or self.pass_complete():
+            return
+        shards = self._behind()
+        begin = self.clock()
+        while shards > 0 and self.cursor < len(self.channels):
+            if self.budget and self.clock() - begin >= self.budget:
+                _LOGGER.debug("EPG tick budget used up at channel %d", self.cursor)
+                break
+            shard = self.channels[self.cursor : self.cursor + self.shard_size]
+            yield shard
+            self.cursor += len(shard)
+            shards -= 1
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+DEPTH_FULL = "full"
+DEPTH_NOWNEXT = "nownext"
+DEPTH_SKIP = "skip"
+
+
+"""
+Parses channel number ranges like "1-50", "7" or 7.
+:return list of (first, last)
+"""
+
+
+def parse_ranges(numbers):
+    ranges = []
+    for item in numbers or ():
+        text = str(item).replace(" ", "")
+        first, _, last = text.partition("-")
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            _LOGGER.warning("Invalid channel range %s", item)
+            continue
+        ranges.append((min(first, last), max(first, last)))
+    return ranges
+
+
+"""
+Of a channel's events ({start: event}, as held by EpgStore) only the one running
+at `now` and the one after it.
+:return dict
+"""
+
+
+def now_next(events, now):
+    kept = {}
+    for start in sorted((s for s, e in events.items() if isinstance(e, dict)), key=int):
+        event = events[start]
+        if int(start) + int(event.get("DURATION") or 0) <= now:
+            continue
+        kept[start] = event
+        if len(kept) == 2:
+            break
+    meta = {k: v for k, v in events.items() if not isinstance(v, dict)}
+    meta.update(kept)
+    return meta
+
+
+class ChannelScope(object):
+    """
+    Decides which channels get which EPG depth.
+    Favorites (channel ids, names or numbers) get the full guide and are refreshed
+    first and more often, channels of the given groups (from LSTC :groups) or number
+    ranges get the full guide, all others get `others` (skip, nownext or full).
+    """
+
+    def __init__(self, favorites=(), groups=(), numbers=(), others=DEPTH_SKIP):
+        self.favorites = [str(f).lower() for f in favorites or ()]
+        self.groups = set(str(g).lower() for g in groups or ())
+        self.ranges = parse_ranges(numbers)
+        self.others = others
+
+    def favorite_rank(self, channel):
+        keys = (
+            str(channel.get("id") or "").lower(),
+            str(channel.get("name") or "").lower(),
+            str(channel.get("number") or ""),
+        )
+        for rank, favorite in enumerate(self.favorites):
+            if favorite in keys:
+                return rank
+        return None
+
+    def in_scope(self, channel):
+        if str(channel.get("group") or "").lower() in self.groups:
+            return True
+        try:
+            number = int(channel.get("number"))
+        except (TypeError, ValueError):
+            return False
+        return any(first <= number <= last for first, last in self.ranges)
+
+    def depth(self, channel):
+        if self.favorite_rank(channel) is not None or self.in_scope(channel):
+            return DEPTH_FULL
+        return self.others
+
+    """
+    The channels to refresh in refresh order: favorites (in configured order), the
+    other full depth channels, then the rest unless skipped. Group separators and
+    channels without id are left out.
+    :return list of channels
+    """
+
+    def order(self, channels):
+        favorites = []
+        full = []
+        rest = []
+        for channel in channels or ():
+            if not channel or not channel.get("id"):
+                continue
+            rank = self.favorite_rank(channel)
+            if rank is not None:
+                favorites.append((rank, channel))
+            elif self.in_scope(channel):
+                full.append(channel)
+            elif self.others != DEPTH_SKIP:
+                rest.append(channel)
+        favorites.sort(key=lambda item: item[0])
+        return [channel for _, channel in favorites] + full + rest
+
+    def favorites_of(self, channels):
+        return [c for c in channels if c and self.favorite_rank(c) is not None]
@@ -2,27 +2,143 @@
 from ..tgsvdrp.tgsvdrp import SVDRP
 from ..tgsvdrp.tgsvdrp import SVDRP_COMMANDS
 from ..tgsvdrp.tgsvdrp import SVDRP_RESULT_CODE
+from .epgsearch import EPGSEARCH_PLUGIN
+from .epgsearch import SEARCH_MODE_ALL_WORDS
+from .epgsearch import conflicts_command
+from .epgsearch import parse_conflict
+from .epgsearch import parse_plugins
+from .epgsearch import parse_search_result
+from .epgsearch import reply_values
+from .epgsearch import search_command
+from .epgsearch import search_settings
+from .timers import FLAG_TIMER_ACTIVE
+from .timers import FLAG_TIMER_INSTANT_RECORDING
+from .timers import FLAG_TIMER_RECORDING
+from .timers import FLAG_TIMER_VPS
+from .timers import TIMER_OP_DELETE
+from .timers import TIMER_OP_NEW
+from .timers import timer_commands
+from .timers import timer_result
+from .timers import Timer
 
 
 import logging
 import re
+import time
 from collections import namedtuple
 
 epg_info = namedtuple("EPGDATA", "Channel Title Description")
 
-FLAG_TIMER_ACTIVE = 1
-FLAG_TIMER_INSTANT_RECORDING = 2
-FLAG_TIMER_VPS = 4
-FLAG_TIMER_RECORDING = 8
+EPG_DATA_RECORD = int(SVDRP_RESULT_CODE.EPG_DATA_RECORD)
+# seconds until the plugin list is asked again
+PLUGINS_RECHECK = 3600
+
+_TAG_CHANNEL = ord("C")
+_TAG_CHANNEL_END = ord("c")
+_TAG_EVENT = ord("E")
+_TAG_EVENT_END = ord("e")
+_TAG_STREAMDETAILS = ord("X")
+_TAG_FIELDS = {
+    ord("T"): "TITLE",
+    ord("S"): "SUBTITLE",
+    ord("D"): "DESCRIPTION",
+    ord("G"): "GENRE",
+    ord("R"): "MINAGE",
+    ord("V"): "VPSTIME",
+}
 
 _LOGGER = logging.getLogger(__name__)
 
 
+"""
+Parses EPG records (C/E/T/S/D/G/R/V/X/e/c) into a dict of channels.
+records is an iterable of lines providing tag (record letter as int), raw_value
+(bytes-like slice) and decode(raw), text is decoded once when it is stored.
+:return dict channelid -> {"channelid", "channelname", <start>: event}
+"""
+
+
+def parse_epg_records(records):
+    return dict(iter_epg_records(records))
+
+
+"""
+Like parse_epg_records, but yields every channel as soon as its "c" record
+arrived, so only one channel is held at a time.
+:return iterator of (channelid, {"channelid", "channelname", <start>: event})
+"""
+
+
+def iter_epg_records(records):
+    channel = info = None
+    channelkey = None
+    for record in records:
+        tag = record.tag
+        if tag == _TAG_CHANNEL:
+            if channel is None:
+                parts = bytes(record.raw_value).split(None, 1)
+                if parts and b"-" in parts[0]:
+                    channel = {}
+                    channel["channelid"] = channelkey = parts[0].decode(
+                        "ascii", "replace"
+                    )
+                    channel["channelname"] = (
+                        record.decode(parts[1]) if len(parts) > 1 else ""
+                    )
+        elif tag == _TAG_EVENT:
+            if channel is not None and info is None:
+                parts = bytes(record.raw_value).split()
+                if len(parts) >= 3 and parts[0].isdigit() and parts[1].isdigit():
+                    info = {}
+                    info["START"] = parts[1].decode("ascii")
+                    info["DURATION"] = parts[2].decode("ascii", "replace")
+                    info["EVENTID"] = parts[0].decode("ascii")
+        elif tag == _TAG_EVENT_END:
+            if info is not None:
+                channel[info["START"]] = info
+            info = None
+        elif tag == _TAG_CHANNEL_END:
+            if channel is not None:
+                yield channelkey, dict(sorted(channel.items()))
+            channel = info = None
+        elif info is not None:
+            field = _TAG_FIELDS.get(tag)
+            if field is not None:
+                info[field] = record.decode(record.raw_value)
+            elif tag == _TAG_STREAMDETAILS:
+                info.setdefault("STREAMDETAILS", []).append(
+                    record.decode(record.raw_value)
+                )
+
+
+"""
+Name of a group separator of channels.conf / LSTC :groups (":Name" or ":@201 Name").
+:return name
+"""
+
+
+def channel_group_name(value):
+    name = value.lstrip(":")
+    if name.startswith("@"):
+        name = name[1:].lstrip("0123456789")
+    return name.strip()
+
+
 class PYVDR(object):
-    def __init__(self, hostname="localhost", timeout=10):
+    def __init__(self, hostname="localhost", timeout=10, port=6419, conf_files=None):
         self.hostname = hostname
-        self.svdrp = SVDRP(hostname=self.hostname, timeout=timeout)
+        self.svdrp = SVDRP(hostname=self.hostname, port=port, timeout=timeout)
         self.timers = None
+        # local channels.conf/timers.conf (conffiles.VdrConfFiles), SVDRP if None
+        self.conf_files = conf_files
+        self.timers_cached = False
+        # last LSTT and the stamp of the config files at that time
+        self._timers = None
+        self._timers_stamp = None
+        # channel number -> channel id of the last channel list
+        self.channel_ids = {}
+        self._plugins = None
+        self._plugins_checked = None
 
     def stat(self):
         self.svdrp.send_cmd(SVDRP_COMMANDS.DISK_INFO)
@@ -48,28 +164,45 @@ class PYVDR(object):
     """
 
     def get_channels(self):
-        _LOGGER.debug("{SVDRP_COMMANDS.GET_CHANNELS}")
+        channels = self._get_channels()
+        if channels is not None:
+            self.channel_ids = {c["number"]: c["id"] for c in channels if c}
+        return channels
+
+    def _get_channels(self):
+        if self.conf_files is not None:
+            channels = self.conf_files.get_channels()
+            if channels is not None:
+                return channels
+        _LOGGER.debug("%s", SVDRP_COMMANDS.GET_CHANNELS)
         # self.svdrp.send_cmd("{} :ids ".format(SVDRP_COMMANDS.GET_CHANNELS))
         # self.svdrp.send_cmd(f"{SVDRP_COMMANDS.GET_CHANNELS} :ids")
         self.svdrp.send_cmd(SVDRP_COMMANDS.GET_CHANNELS)
         responses = self.svdrp.get_response()
-        if len(responses) < 1:
+        if len(responses) < 1 or self.svdrp.partial:
+            # an incomplete list would drop the missing channels
             _LOGGER.debug("Response of get channels cmd: NONE")
             return None
         # get 2nd element (1. welcome, 2. response, 3. quit msg)
         myresponse = []
+        group = ""
         for response in responses:
             # print(response)
             if response.Code != SVDRP_RESULT_CODE.SUCCESS:
                 continue
-            myresponse.append(self._parse_channels_response(response))
-        _LOGGER.debug("Response of get channels cmd: '%s' channels" % len(myresponse))
+            channel = self._parse_channels_response(response)
+            if channel:
+                channel["group"] = group
+            elif response.Value.startswith(":"):
+                group = channel_group_name(response.Value)
+            myresponse.append(channel)
+        _LOGGER.debug("Response of get channels cmd: '%s' channels", len(myresponse))
         # _LOGGER.debug("Response of get channels cmd: '%s'" % myresponse)
         return myresponse
 
     @staticmethod
     def _parse_channels_response(channel_data):
-        _LOGGER.debug("Parsing Channel response to fields: %s" % channel_data.Value)
+        _LOGGER.debug("Parsing Channel response to fields: %s", channel_data)
         channel_info = {}
         channel_parts = re.match(
             r"^([A-Z][0-9|\-]*?)\s(.*?);.*$", channel_data.Value, re.M | re.I
@@ -87,18 +220,18 @@ class PYVDR(object):
     def get_channel(self):
         self.svdrp.send_cmd(SVDRP_COMMANDS.GET_CHANNEL)
         responses = self.svdrp.get_response()
-        _LOGGER.debug("Response of get channel cmd: '%s'" % responses)
-        if len(responses) < 1:
+        _LOGGER.debug("Response of get channel cmd: '%s'", responses)
+        if len(responses) < 1 or self.svdrp.partial:
             return None
         # get 2nd element (1. welcome, 2. response, 3. quit msg)
         generic_response = responses[-2]
         channel = self._parse_channel_response(generic_response)
-        _LOGGER.debug("Returned Chan: '%s'" % channel)
+        _LOGGER.debug("Returned Chan: '%s'", channel)
         return channel
 
     @staticmethod
     def _parse_channel_response(channel_data):
-        _LOGGER.debug("Parsing Channel response to fields: %s" % channel_data.Value)
+        _LOGGER.debug("Parsing Channel response to fields: %s", channel_data)
         channel_info = {}
         channel_info["number"] = channel_data.Separator
         channel_info["name"] = channel_data.Value
@@ -125,26 +258,64 @@ class PYVDR(object):
             timer["description"] = ""
             timer["series"] = timer["name"].find("~") != -1
             timer["instant"] = False
-            _LOGGER.debug("Parsed timer: {}".format(timer))
+            _LOGGER.debug("Parsed timer: %s", timer)
         else:
-            _LOGGER.debug(
-                "You might want to check the regex for timer parsing?! {}".format(
-                    response
+            # timer without epgsearch data, e.g. created by write_timers
+            plain = Timer.parse(response.Value)
+            if plain is None:
+                _LOGGER.debug(
+                    "You might want to check the regex for timer parsing?! %s",
+                    response,
                 )
-            )
+                return timer
+            timer["status"] = str(plain.flags)
+            timer["channel"] = plain.channel
+            timer["date"] = plain.day
+            timer["start"] = plain.start
+            timer["end"] = plain.stop
+            timer["name"] = plain.file
+            timer["eventid"] = ""
+            timer["timerid"] = ""
+            timer["description"] = ""
+            timer["series"] = timer["name"].find("~") != -1
+            timer["instant"] = False
 
+        # number of the timer in VDR, addresses it for MODT/DELT
+        timer["id"] = response.Separator
         return timer
 
-    def get_timers(self):
+    """
+    Gets all timers, None if the list did not arrive completely.
+    The timers and their ids always come from LSTT. The last LSTT is reused with
+    cached=True, or with local config files while timers.conf and channels.conf did
+    not change (a changed file always asks VDR); its recording flags may be
+    outdated then, timers_cached tells so. write_timers drops the cached list,
+    use_files=False always asks VDR.
+    """
+
+    def get_timers(self, use_files=True, cached=False):
+        stamp = None
+        if self.conf_files is not None:
+            stamp = self.conf_files.timers_stamp()
+        if use_files and stamp is not None:
+            # the files tell whether the timers changed
+            cached = stamp == self._timers_stamp
+        if use_files and cached and self._timers is not None:
+            self.timers_cached = True
+            return [dict(timer) for timer in self._timers]
+        self.timers_cached = False
         timers = []
         self.svdrp.send_cmd(SVDRP_COMMANDS.LIST_TIMERS)
+        if self.svdrp.partial:
+            return None
         responses = self.svdrp.get_response()
-        print("timers", responses)
         for response in responses:
             if response.Code != SVDRP_RESULT_CODE.SUCCESS:
                 continue
             timers.append(self._parse_timer_response(response))
-        return timers
+        self._timers = timers
+        self._timers_stamp = stamp
+        return [dict(timer) for timer in timers]
 
     def is_recording(self):
         self.svdrp.send_cmd(SVDRP_COMMANDS.LIST_TIMERS)
@@ -164,73 +335,148 @@ class PYVDR(object):
 
         return None
 
+    """
+    Creates, modifies and deletes timers pipelined in one SVDRP session.
+    ops is a list of (TIMER_OP_NEW | TIMER_OP_MODIFY, Timer) or
+    (TIMER_OP_DELETE, id), see tgpyvdr.timers.
+    :return list of result dicts in the order of ops
+    """
+
+    def write_timers(self, ops):
+        ops = list(ops)
+        # the next get_timers asks VDR again
+        self._timers = None
+        replies = self.svdrp.send_batch(timer_commands(ops))
+        results = [
+            timer_result(op, arg, lines) for (op, arg), lines in zip(ops, replies)
+        ]
+        _LOGGER.debug(
+            "Timer batch: %d of %d done", sum(r["ok"] for r in results), len(results)
+        )
+        return results
+
+    def add_timers(self, timers):
+        return self.write_timers((TIMER_OP_NEW, timer) for timer in timers)
+
+    def delete_timers(self, ids):
+        # highest number first, older VDRs renumber the timers after a deletion
+        ids = sorted(set(int(id) for id in ids), reverse=True)
+        return self.write_timers((TIMER_OP_DELETE, id) for id in ids)
+
     def get_channel_epg_info(self, channel_no=1, filter=""):
-        # epg_title = epg_channel = epg_description = None
         # self.svdrp.send_cmd(f"{SVDRP_COMMANDS.LIST_EPG} {channel_no} {filter}")
-        self.svdrp.send_cmd(f"LSTE {channel_no} {filter}")
-        epg_data = self.svdrp.get_response()[1:]
-        _LOGGER.debug("epg raw data: '%s' items" % epg_data)
-
-        # print (epg_data)
-        setChannel = setInfo = 0
-        epg = channel = info = dict()
-        channelkey = infokey = "none"
-        for data in epg_data:
-            # _LOGGER.debug("epg data: '%s' items" % data)
-
-            if data.Code != SVDRP_RESULT_CODE.EPG_DATA_RECORD:
-                continue
-            # _LOGGER.debug("epg data: '%s' items" % data)
+        # streamed, every line is parsed and dropped as it arrives
+        # channels cut off by the deadline are incomplete and left out by the parser
+        epg = parse_epg_records(
+            data
+            for data in self.svdrp.iter_cmd(f"LSTE {channel_no} {filter}")
+            if data.code == EPG_DATA_RECORD
+        )
+        _LOGGER.debug("Response of get_channel_epg_info cmd: '%s' items", len(epg))
+        return epg
 
-            if data.Separator == "C" and setChannel == 0:
-                channel_match = re.match(
-                    r"^([A-Z]\-[0-9|\-]+?)\s(.*)$", data.Value, re.M | re.I
-                )
-                if channel_match:
-                    setChannel = 1
-                    channel = dict()
-                    channel["channelid"] = channelkey = channel_match.group(1)
-                    channel["channelname"] = channel_match.group(2)
-            elif data.Separator == "E" and setChannel == 1 and setInfo == 0:
-                info_match = re.match(
-                    r"^([0-9]+?)\s([0-9]+?)\s([0-9]+?)\s.*$", data.Value, re.M | re.I
-                )
-                if info_match:
-                    setInfo = 1
-                    info = dict()
-                    info["START"] = infokey = info_match.group(2)
-                    info["DURATION"] = info_match.group(3)
-                    info["EVENTID"] = info_match.group(1)
-
-            elif data.Separator == "e":
-                if setInfo == 1:
-                    channel[infokey] = info
-                setInfo = 0
-            elif data.Separator == "c":
-                if setChannel == 1:
-                    epg[channelkey] = dict(sorted(channel.items()))
-                setInfo = 0
-                setChannel = 0
-            elif setInfo == 1:
-                if data.Separator == "T":
-                    info["TITLE"] = data.Value
-                if data.Separator == "S":
-                    info["SUBTITLE"] = data.Value
-                if data.Separator == "D":
-                    info["DESCRIPTION"] = data.Value
-                if data.Separator == "G":
-                    info["GENRE"] = data.Value
-                if data.Separator == "R":
-                    info["MINAGE"] = data.Value
-                if data.Separator == "V":
-                    info["VPSTIME"] = data.Value
-                if data.Separator == "X":
-                    if not "STREAMDETAILS" in info:
-                        info["STREAMDETAILS"] = list()
-                    info["STREAMDETAILS"].append(data.Value)
-        _LOGGER.debug("Response of get_channel_epg_info cmd: '%s' items" % len(epg))
+    """
+    Gets only the running and the following event of a channel (two short LSTE).
+    :return dict like get_channel_epg_info
+    """
+
+    def get_channel_now_next(self, channel_no):
+        epg = self.get_channel_epg_info(channel_no, "now")
+        for channelid, channel in self.get_channel_epg_info(channel_no, "next").items():
+            epg.setdefault(channelid, {}).update(channel)
         return epg
 
+    """
+    Gets the undecoded LSTE reply of one channel after the other, e.g. for parsing
+    in worker processes (see epgworker.EpgWorkerPool). Every channel is a command of
+    its own with the LSTE deadline, the connection is free for other commands in
+    between. Incomplete replies are left out.
+    :return generator of (channelid, bytes, encoding)
+    """
+
+    def iter_epg_raw(self, channelids, filter=""):
+        for channelid in channelids:
+            raw = self.svdrp.send_cmd_raw(
+                f"{SVDRP_COMMANDS.LIST_EPG.value} {channelid} {filter}".strip()
+            )
+            if self.svdrp.partial:
+                _LOGGER.debug("Incomplete EPG of %s, skipped", channelid)
+                continue
+            yield channelid, raw, self.svdrp.server_encoding
+
+    """
+    Names of the plugins loaded by VDR, asked once per PLUGINS_RECHECK.
+    :return set, None if VDR did not answer
+    """
+
+    def get_plugins(self):
+        now = time.monotonic()
+        if (
+            self._plugins_checked is not None
+            and now - self._plugins_checked < PLUGINS_RECHECK
+        ):
+            return self._plugins
+        lines = self.svdrp.send_batch([SVDRP_COMMANDS.LIST_PLUGINS])[0]
+        if lines is None:
+            return self._plugins
+        self._plugins = parse_plugins(lines)
+        self._plugins_checked = now
+        _LOGGER.debug("VDR plugins: %s", ", ".join(sorted(self._plugins)))
+        return self._plugins
+
+    def has_epgsearch(self):
+        return EPGSEARCH_PLUGIN in (self.get_plugins() or ())
+
+    """
+    Searches the guide on the VDR with the epgsearch plugin (PLUG epgsearch QRYS),
+    without transferring it. Channel numbers are mapped to ids with the channel
+    list fetched last.
+    :return list of results (see epgsearch.parse_search_result), None if
+            epgsearch is not available or did not answer
+    """
+
+    def epgsearch_query(
+        self,
+        query,
+        mode=SEARCH_MODE_ALL_WORDS,
+        title=True,
+        subtitle=True,
+        description=True,
+    ):
+        if not self.has_epgsearch():
+            return None
+        settings = search_settings(query, mode, title, subtitle, description)
+        values = reply_values(self.svdrp.send_batch([search_command(settings)])[0])
+        if values is None:
+            return None
+        results = []
+        for value in values:
+            result = parse_search_result(value, self.channel_ids)
+            if result is not None:
+                results.append(result)
+        _LOGGER.debug("epgsearch found %d events for '%s'", len(results), query)
+        return results
+
+    """
+    Timer conflicts as checked by epgsearch (PLUG epgsearch LSCC), relevant=True
+    leaves out conflicts epgsearch considers irrelevant.
+    :return list of conflicts (see epgsearch.parse_conflict), None if epgsearch
+            is not available or did not answer
+    """
+
+    def epgsearch_conflicts(self, relevant=False):
+        if not self.has_epgsearch():
+            return None
+        values = reply_values(self.svdrp.send_batch([conflicts_command(relevant)])[0])
+        if values is None:
+            return None
+        conflicts = []
+        for value in values:
+            conflict = parse_conflict(value)
+            if conflict is not None:
+                conflicts.append(conflict)
+        return conflicts
+
     def channel_up(self):
         self.svdrp.send_cmd(SVDRP_COMMANDS.CHANNEL_UP)
         response_text = self.svdrp.get_response_as_text()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import logging
+import time
+from collections import namedtuple
+
+_LOGGER = logging.getLogger(__name__)
+
+FLAG_TIMER_ACTIVE = 1
+FLAG_TIMER_INSTANT_RECORDING = 2
+FLAG_TIMER_VPS = 4
+FLAG_TIMER_RECORDING = 8
+
+TIMER_OP_NEW = "new"
+TIMER_OP_MODIFY = "modify"
+TIMER_OP_DELETE = "delete"
+
+TIMER_DEFAULT_PRIORITY = 50
+TIMER_DEFAULT_LIFETIME = 99
+# VDR's defaults for MarginStart / MarginStop
+TIMER_MARGIN_BEFORE = 2 * 60
+TIMER_MARGIN_AFTER = 10 * 60
+
+_TIMER_FIELDS = "flags channel day start stop priority lifetime file aux"
+
+
+class Timer(namedtuple("Timer", _TIMER_FIELDS + " id")):
+    """
+    A VDR timer as written by NEWT/MODT and listed by LSTT:
+    flags:channel:day:start:stop:priority:lifetime:file:aux
+    channel is a channel number or channel id, day is YYYY-MM-DD, start and stop
+    are local times as HHMM. id is the number VDR assigned, None for a new timer.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
+        channel,
+        day,
+        start,
+        stop,
+        file,
+        flags=FLAG_TIMER_ACTIVE,
+        priority=TIMER_DEFAULT_PRIORITY,
+        lifetime=TIMER_DEFAULT_LIFETIME,
+        aux="",
+        id=None,
+    ):
+        return super().__new__(
+            cls, flags, channel, day, start, stop, priority, lifetime, file, aux, id
+        )
+
+    """
+    Parses the timer text of a LSTT/NEWT/MODT reply line, id is the number in
+    front of it.
+    :return Timer or None
+    """
+
+    @classmethod
+    def parse(cls, value, id=None):
+        parts = value.split(":", 8)
+        if len(parts) < 8:
+            return None
+        try:
+            return cls(
+                flags=int(parts[0]),
+                channel=parts[1],
+                day=parts[2],
+                start=parts[3],
+                stop=parts[4],
+                priority=int(parts[5]),
+                lifetime=int(parts[6]),
+                file=parts[7],
+                aux=parts[8] if len(parts) > 8 else "",
+                id=id,
+            )
+        except ValueError:
+            return None
+
+    def to_svdrp(self):
+        return ":".join(
+            str(value)
+            for value in (
+                self.flags,
+                self.channel,
+                self.day,
+                self.start,
+                self.stop,
+                self.priority,
+                self.lifetime,
+                _escape_file(self.file),
+                self.aux.replace("\n", " "),
+            )
+        )
+
+    def command(self):
+        if self.id is None:
+            return "NEWT {}".format(self.to_svdrp())
+        return "MODT {} {}".format(self.id, self.to_svdrp())
+
+
+def _escape_file(name):
+    # VDR stores ':' in recording names as '|', a newline would end the command
+    return name.replace(":", "|").replace("\n", " ").replace("\r", " ")
+
+
+"""
+Builds a timer for an EPG event (as held by EpgStore / parse_epg_records), with
+margins in seconds before and after the event.
+:return Timer
+"""
+
+
+def timer_from_event(
+    channelid,
+    event,
+    margin_before=TIMER_MARGIN_BEFORE,
+    margin_after=TIMER_MARGIN_AFTER,
+    priority=TIMER_DEFAULT_PRIORITY,
+    lifetime=TIMER_DEFAULT_LIFETIME,
+    vps=False,
+):
+    begin = int(event["START"])
+    end = begin + int(event.get("DURATION") or 0)
+    if vps and event.get("VPSTIME"):
+        # VPS timers start at the announced time without margins
+        vpstime = int(event["VPSTIME"])
+        start = time.localtime(vpstime)
+        stop = time.localtime(vpstime + end - begin)
+        flags = FLAG_TIMER_ACTIVE | FLAG_TIMER_VPS
+    else:
+        start = time.localtime(begin - margin_before)
+        stop = time.localtime(end + margin_after)
+        flags = FLAG_TIMER_ACTIVE
+    return Timer(
+        channel=channelid,
+        day=time.strftime("%Y-%m-%d", start),
+        start=time.strftime("%H%M", start),
+        stop=time.strftime("%H%M", stop),
+        file=event.get("TITLE") or "",
+        flags=flags,
+        priority=priority,
+        lifetime=lifetime,
+    )
+
+
+"""
+Looks up an event of the cached guide by its event id. Called from service
+threads while the EPG sensor evicts and replaces events, so it walks a copy.
+:return event dict or None
+"""
+
+
+def find_event(store, channelid, eventid):
+    channel = store.get_channel(channelid)
+    if channel is None:
+        return None
+    eventid = str(eventid)
+    for event in list(channel["epg"].values()):
+        if event.get("EVENTID") == eventid:
+            return event
+    return None
+
+
+"""
+Turns timer operations into SVDRP commands.
+ops is a list of (TIMER_OP_NEW, Timer), (TIMER_OP_MODIFY, Timer) or
+(TIMER_OP_DELETE, id).
+:return list of command lines
+"""
+
+
+def timer_commands(ops):
+    cmds = []
+    for op, arg in ops:
+        if op == TIMER_OP_DELETE:
+            cmds.append("DELT {}".format(int(arg)))
+        elif op == TIMER_OP_MODIFY:
+            if arg.id is None:
+                raise ValueError("modifying a timer needs its id")
+            cmds.append(arg.command())
+        elif op == TIMER_OP_NEW:
+            cmds.append(arg._replace(id=None).command())
+        else:
+            raise ValueError("unknown timer operation {}".format(op))
+    return cmds
+
+
+"""
+Per operation result of a batch, from the reply lines of its command
+(None if no reply arrived).
+:return dict with op, ok, code, message and, on success of NEWT/MODT, id and timer
+"""
+
+
+def timer_result(op, arg, lines):
+    result = {"op": op, "ok": False, "code": None, "message": "no reply"}
+    if op == TIMER_OP_DELETE:
+        result["id"] = int(arg)
+    elif arg.id is not None and op == TIMER_OP_MODIFY:
+        result["id"] = arg.id
+    if not lines:
+        return result
+    last = lines[-1]
+    result["code"] = last.code
+    result["message"] = last.decode(last.raw_value) if last.raw_value else ""
+    result["ok"] = last.code == 250
+    if result["ok"] and op != TIMER_OP_DELETE:
+        number = last.decode(last.raw_separator)
+        timer = Timer.parse(
+            result["message"], int(number) if number.isdigit() else None
+        )
+        if timer is not None:
+            result["id"] = timer.id
+            result["timer"] = timer._asdict()
+    return result
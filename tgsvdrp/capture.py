@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Capture of SVDRP traffic for replaying it offline.
+
+SvdrpProxy listens locally and forwards every connection to the VDR, writing
+commands, reply bytes and their timing to a capture file: gzip compressed JSON
+lines, a header followed by one record per event:
+
+    {"format": "svdrp-capture", "version": 1, "host": ..., "port": ..., "started": ..., "anonymized": ...}
+    {"c": <connection>, "t": <seconds since start>, "e": "open" | "close"}
+    {"c": <connection>, "t": <seconds since start>, "d": ">" | "<", "s": <text>}
+
+">" is sent by the client, "<" by the VDR. "s" holds the bytes decoded as UTF-8,
+data that is not valid UTF-8 is stored base64 encoded in "b" instead.
+With anonymize titles, subtitles and descriptions of the guide (215-T/S/D), timer
+files and recording names are replaced word by word with pseudo words of the same
+length; the same word always gets the same replacement, so sizes and repetitions
+stay realistic.
+
+    python -m tgvdr.tgsvdrp.capture --host vdr --listen 6420 -o vdr.capture.gz --anonymize
+
+read_capture() and replay_replies() turn a capture into replies for the fake
+server (fakeserver.FakeSvdrpServer) and the benchmarks.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from .tgsvdrp import greeting_encoding
+from .tgsvdrp import split_lines
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_FORMAT = "svdrp-capture"
+CAPTURE_VERSION = 1
+CAPTURE_SENT = ">"
+CAPTURE_RECEIVED = "<"
+CAPTURE_OPEN = "open"
+CAPTURE_CLOSE = "close"
+CAPTURE_RECV_SIZE = 65536
+
+_EPG_TEXT_TAGS = ("T ", "S ", "D ")
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class Anonymizer(object):
+    """Replaces words by pseudo words of the same length, stable per salt."""
+
+    def __init__(self, salt=""):
+        self.salt = salt.encode()
+        self._words = {}
+
+    def word(self, word):
+        replacement = self._words.get(word)
+        if replacement is None:
+            digest = hashlib.sha256(self.salt + word.encode()).digest()
+            letters = [
+                _LETTERS[digest[i % len(digest)] % len(_LETTERS)]
+                for i in range(len(word))
+            ]
+            if word[:1].isupper():
+                letters[0] = letters[0].upper()
+            replacement = self._words[word] = "".join(letters)
+        return replacement
+
+    def text(self, text):
+        out = []
+        start = None
+        for i, char in enumerate(text):
+            if char.isalnum():
+                if start is None:
+                    start = i
+                continue
+            if start is not None:
+                out.append(self.word(text[start:i]))
+                start = None
+            out.append(char)
+        if start is not None:
+            out.append(self.word(text[start:]))
+        return "".join(out)
+
+    """
+    Anonymizes a reply line (without line end) of the given command.
+    :return str
+    """
+
+    def line(self, cmd, line):
+        code, value = line[:4], line[4:]
+        verb = cmd.split(None, 1)[0].upper() if cmd else ""
+        if code[:3] == "215" and value[:2] in _EPG_TEXT_TAGS:
+            return code + value[:2] + self.text(value[2:])
+        if code[:3] != "250":
+            return line
+        if verb == "LSTT":
+            # number flags:channel:day:start:stop:priority:lifetime:file:aux
+            fields = value.split(":", 8)
+            if len(fields) == 9:
+                fields[7] = self.text(fields[7])
+                fields[8] = self.text(fields[8])
+                return code + ":".join(fields)
+        elif verb == "LSTR":
+            # number date time [length][*] name
+            parts = value.split(" ", 4)
+            if len(parts) == 5:
+                parts[4] = self.text(parts[4])
+                return code + " ".join(parts)
+            if len(parts) == 4:
+                parts[3] = self.text(parts[3])
+                return code + " ".join(parts)
+        return line
+
+
+class CaptureWriter(object):
+    """Writes capture records, shared by all connections of a proxy."""
+
+    def __init__(self, path, host, port, anonymize=False, clock=time.monotonic):
+        self.clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+        self._connections = 0
+        self._out = gzip.open(path, "wt", encoding="utf-8")
+        self._write(
+            {
+                "format": CAPTURE_FORMAT,
+                "version": CAPTURE_VERSION,
+                "host": host,
+                "port": port,
+                "started": time.time(),
+                "anonymized": bool(anonymize),
+            }
+        )
+
+    def _write(self, record):
+        self._out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def connection(self):
+        with self._lock:
+            self._connections += 1
+            return self._connections
+
+    def event(self, conn, event):
+        with self._lock:
+            self._write({"c": conn, "t": self.clock() - self._start, "e": event})
+
+    def data(self, conn, direction, data):
+        record = {"c": conn, "t": 0.0, "d": direction}
+        try:
+            record["s"] = data.decode("utf-8")
+        except UnicodeDecodeError:
+            record["b"] = base64.b64encode(data).decode("ascii")
+        with self._lock:
+            record["t"] = self.clock() - self._start
+            self._write(record)
+
+    def close(self):
+        with self._lock:
+            self._out.close()
+
+
+class _ReplyRewriter(object):
+    """Anonymizes a reply stream line by line, keeping track of the commands."""
+
+    def __init__(self, anonymizer):
+        self.anonymizer = anonymizer
+        self.commands = []
+        self.encoding = None
+        self._pending = b""
+
+    def sent(self, data):
+        for line in data.decode("utf-8", "replace").splitlines():
+            if line.strip():
+                self.commands.append(line.strip())
+
+    def received(self, data):
+        data = self._pending + data
+        last = data.rfind(b"\n")
+        if last < 0:
+            self._pending = data
+            return b""
+        self._pending = data[last + 1 :]
+        out = []
+        for raw in data[: last + 1].split(b"\n")[:-1]:
+            raw = raw.rstrip(b"\r")
+            if self.encoding is None:
+                # the greeting, it announces the character set
+                lines = split_lines(raw)
+                self.encoding = greeting_encoding(lines[0] if lines else None)
+                out.append(raw + b"\r\n")
+                continue
+            text = raw.decode(self.encoding, "surrogateescape")
+            cmd = self.commands[0] if self.commands else ""
+            text = self.anonymizer.line(cmd, text)
+            if text[3:4] == " " and self.commands:
+                self.commands.pop(0)
+            out.append(text.encode(self.encoding, "surrogateescape") + b"\r\n")
+        return b"".join(out)
+
+    def flush(self):
+        data, self._pending = self._pending, b""
+        return data
+
+
+class _ProxyHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        proxy = self.server.proxy
+        writer = proxy.writer
+        conn = writer.connection()
+        try:
+            upstream = socket.create_connection(
+                (proxy.host, proxy.port), timeout=proxy.timeout
+            )
+        except OSError as e:
+            _LOGGER.warning("Unable to connect to %s:%d: %s", proxy.host, proxy.port, e)
+            return
+        upstream.settimeout(None)
+        writer.event(conn, CAPTURE_OPEN)
+        rewriter = _ReplyRewriter(proxy.anonymizer) if proxy.anonymizer else None
+        pump = threading.Thread(
+            target=self._pump_replies,
+            args=(upstream, conn, rewriter),
+            name="svdrp-capture",
+            daemon=True,
+        )
+        pump.start()
+        try:
+            while True:
+                data = self.request.recv(CAPTURE_RECV_SIZE)
+                if not data:
+                    break
+                if rewriter is not None:
+                    rewriter.sent(data)
+                writer.data(conn, CAPTURE_SENT, data)
+                upstream.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                upstream.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            pump.join()
+            upstream.close()
+            writer.event(conn, CAPTURE_CLOSE)
+
+    def _pump_replies(self, upstream, conn, rewriter):
+        writer = self.server.proxy.writer
+        try:
+            while True:
+                data = upstream.recv(CAPTURE_RECV_SIZE)
+                if not data:
+                    break
+                # the client gets the original bytes, only the capture is anonymized
+                self.request.sendall(data)
+                if rewriter is not None:
+                    data = rewriter.received(data)
+                if data:
+                    writer.data(conn, CAPTURE_RECEIVED, data)
+        except OSError:
+            pass
+        if rewriter is not None:
+            rest = rewriter.flush()
+            if rest:
+                writer.data(conn, CAPTURE_RECEIVED, rest)
+        try:
+            self.request.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SvdrpProxy(object):
+    """
+    Forwards SVDRP connections from listen_host:listen_port to a VDR and captures
+    the traffic into path (see module doc). Point the integration or the command
+    line tools at the proxy port while capturing.
+    """
+
+    def __init__(
+        self,
+        host,
+        path,
+        port=6419,
+        listen_host="127.0.0.1",
+        listen_port=6420,
+        anonymize=False,
+        salt="",
+        timeout=10,
+    ):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.timeout = timeout
+        self.anonymizer = Anonymizer(salt) if anonymize else None
+        self.writer = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self.writer = CaptureWriter(
+            self.path, self.host, self.port, self.anonymizer is not None
+        )
+        self._server = _Server((self.listen_host, self.listen_port), _ProxyHandler)
+        self._server.proxy = self
+        self.listen_port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="svdrp-proxy", daemon=True
+        )
+        self._thread.start()
+        _LOGGER.info(
+            "Capturing %s:%d on %s:%d into %s",
+            self.host,
+            self.port,
+            self.listen_host,
+            self.listen_port,
+            self.path,
+        )
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self.writer.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+"""
+Reads a capture file.
+:return (header, {connection: {"sent": bytes, "received": bytes,
+                               "times": [(t, direction, size)]}})
+"""
+
+
+def read_capture(path):
+    connections = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != CAPTURE_FORMAT:
+            raise ValueError("{} is not a SVDRP capture".format(path))
+        for line in f:
+            record = json.loads(line)
+            conn = connections.setdefault(
+                record["c"], {"sent": bytearray(), "received": bytearray(), "times": []}
+            )
+            direction = record.get("d")
+            if direction is None:
+                conn["times"].append((record["t"], record["e"], 0))
+                continue
+            if "s" in record:
+                data = record["s"].encode("utf-8")
+            else:
+                data = base64.b64decode(record["b"])
+            conn["sent" if direction == CAPTURE_SENT else "received"] += data
+            conn["times"].append((record["t"], direction, len(data)))
+    return header, connections
+
+
+"""
+Splits the traffic of each connection into exchanges: the commands sent, in
+order, paired with their reply lines (greeting and quit reply left out) and the
+seconds from the first command to the end of the reply.
+:return list of (command, [line], seconds)
+"""
+
+
+def capture_exchanges(connections):
+    exchanges = []
+    for conn in connections.values():
+        commands = [
+            line.strip()
+            for line in conn["sent"].decode("utf-8", "replace").splitlines()
+            if line.strip()
+        ]
+        times = conn["times"]
+        begin = next((t for t, d, _ in times if d == CAPTURE_SENT), None)
+        end = max((t for t, d, _ in times if d == CAPTURE_RECEIVED), default=begin)
+        received = bytes(conn["received"])
+        greeting = split_lines(received, end=max(received.find(b"\n"), 0))
+        encoding = greeting_encoding(greeting[0] if greeting else None)
+        lines = received.decode(encoding, "replace").split("\n")
+        lines = [line.rstrip("\r") for line in lines if line.strip()]
+        if lines and lines[0].startswith("220"):
+            lines = lines[1:]
+        reply = []
+        index = 0
+        for line in lines:
+            reply.append(line)
+            if line[3:4] != "-":
+                if index < len(commands) and commands[index].lower() != "quit":
+                    # commands of one connection share its duration
+                    seconds = (end - begin) if begin is not None else 0.0
+                    exchanges.append((commands[index], reply, seconds))
+                index += 1
+                reply = []
+    return exchanges
+
+
+"""
+Replies for fakeserver.FakeSvdrpServer from a capture, the last reply of a
+command wins. With timing each reply is delayed as long as it took VDR.
+:return dict command -> lines or callable
+"""
+
+
+def replay_replies(path, timing=False):
+    _, connections = read_capture(path)
+    replies = {}
+    for cmd, lines, seconds in capture_exchanges(connections):
+        if timing and seconds > 0:
+
+            def delayed(_cmd, lines=lines, seconds=seconds):
+                time.sleep(seconds)
+                return lines
+
+            replies[cmd] = delayed
+        else:
+            replies[cmd] = lines
+    return replies
+
+
+"""
+The bytes a client received for a captured command (greeting, reply and quit,
+in VDR's character set), e.g. as input for parser benchmarks.
+:return bytes or None if the command was not captured
+"""
+
+
+def capture_reply(path, cmd):
+    _, connections = read_capture(path)
+    for conn in connections.values():
+        first = conn["sent"].decode("utf-8", "replace").split("\n", 1)[0].strip()
+        if first.lower() == cmd.lower():
+            return bytes(conn["received"])
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="capture")
+    parser.add_argument("--host", required=True, help="VDR to capture")
+    parser.add_argument("--port", type=int, default=6419)
+    parser.add_argument("--listen", type=int, default=6420, help="local proxy port")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("-o", "--output", required=True, help="capture file")
+    parser.add_argument("--anonymize", action="store_true")
+    parser.add_argument("--salt", default="", help="varies the pseudo words")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    proxy = SvdrpProxy(
+        args.host,
+        args.output,
+        port=args.port,
+        listen_host=args.bind,
+        listen_port=args.listen,
+        anonymize=args.anonymize,
+        salt=args.salt,
+    )
+    with proxy:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import logging
+import socketserver
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+FAKE_SERVER_NAME = "fakevdr"
+FAKE_SERVER_VERSION = "2.6.1"
+
+
+"""
+Formats a reply: every line gets the code, all but the last one with "-".
+:return list of str
+"""
+
+
+def reply(code, *lines):
+    lines = lines or ("",)
+    return [
+        "{}{}{}".format(code, "-" if i < len(lines) - 1 else " ", line)
+        for i, line in enumerate(lines)
+    ]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.fake
+        encoding = server.encoding
+        self._send(server.greeting())
+        for raw in self.rfile:
+            cmd = raw.decode(encoding, "replace").strip()
+            if not cmd:
+                continue
+            server.commands.append(cmd)
+            if cmd.lower() == "quit":
+                self._send(reply(221, f"{server.name} closing connection"))
+                return
+            if server.delay:
+                time.sleep(server.delay)
+            self._send(server.answer(cmd))
+
+    def _send(self, lines):
+        encoding = self.server.fake.encoding
+        data = "".join(line + "\r\n" for line in lines).encode(encoding, "replace")
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSvdrpServer(object):
+    """
+    Minimal SVDRP server on localhost for trying the SVDRP client and PYVDR
+    without a VDR. replies maps a command to its reply lines (see reply()) or to a
+    callable(command) returning them; the longest key the command starts with
+    wins (case insensitive), e.g. "LSTT", "PLUG epgsearch QRYS" or "PLUG".
+    Unknown commands get 500. Received commands are kept in commands.
+    """
+
+    def __init__(
+        self,
+        replies=None,
+        host="127.0.0.1",
+        port=0,
+        encoding="utf-8",
+        name=FAKE_SERVER_NAME,
+        delay=0,
+    ):
+        self.replies = dict(replies or {})
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.name = name
+        # seconds before each reply, to try deadlines and priorities
+        self.delay = delay
+        self.commands = []
+        self._server = None
+        self._thread = None
+
+    def greeting(self):
+        now = time.strftime("%a %b %d %H:%M:%S %Y")
+        return reply(
+            220,
+            f"{self.name} SVDRP VideoDiskRecorder {FAKE_SERVER_VERSION}; {now}; "
+            + self.encoding.upper(),
+        )
+
+    def answer(self, cmd):
+        key = cmd.lower()
+        best = None
+        for prefix in self.replies:
+            p = prefix.lower()
+            if (key == p or key.startswith(p + " ")) and (
+                best is None or len(prefix) > len(best)
+            ):
+                best = prefix
+        if best is None:
+            return reply(500, f"Command unrecognized: \"{cmd.split(None, 1)[0]}\"")
+        lines = self.replies[best]
+        if callable(lines):
+            lines = lines(cmd)
+        return list(lines)
+
+    def start(self):
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-svdrp", daemon=True
+        )
+        self._thread.start()
+        _LOGGER.debug("Fake SVDRP server listening on %s:%d", self.host, self.port)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
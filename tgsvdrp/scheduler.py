@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STATE = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_STATE: "state",
+    PRIORITY_BULK: "bulk",
+}
+
+# commands a user is waiting for
+INTERACTIVE_COMMANDS = ("HITK", "NEWT", "DELT", "MODT", "UPDT", "VOLU", "PLAY")
+# commands that transfer the guide or the recording archive
+BULK_COMMANDS = ("LSTE", "LSTR", "LSTC")
+
+
+"""
+Derives the priority class of a SVDRP command line.
+CHAN with an argument switches the channel and is interactive, plain CHAN is polling,
+LSTE restricted to now/next is polling as well.
+:return PRIORITY_*
+"""
+
+
+def command_priority(cmd):
+    parts = getattr(cmd, "value", cmd).split()
+    if not parts:
+        return PRIORITY_STATE
+    verb = parts[0].upper()
+    if verb == "CHAN":
+        return PRIORITY_INTERACTIVE if len(parts) > 1 else PRIORITY_STATE
+    if verb in INTERACTIVE_COMMANDS:
+        return PRIORITY_INTERACTIVE
+    if verb == "LSTE" and any(p.lower() in ("now", "next") for p in parts[1:]):
+        return PRIORITY_STATE
+    if verb in BULK_COMMANDS:
+        return PRIORITY_BULK
+    return PRIORITY_STATE
+
+
+class TokenBucket(object):
+    """
+    Tokens flow in at `rate` per second up to `capacity` (default: one second
+    worth). take() may drive the level below zero, e.g. for reply bytes that are
+    paid after they arrived; delay() tells how long until `amount` is available.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.clock = clock
+        self.level = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount=1):
+        self._refill()
+        missing = amount - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount=1):
+        self._refill()
+        self.level -= amount
+
+
+class CommandScheduler(object):
+    """
+    Serializes all SVDRP exchanges with one VDR host and hands the connection to the
+    waiting command with the best priority class (lowest value), FIFO within a class.
+    Bulk loads are issued as many short commands (one LSTE per channel), so an
+    interactive command waits for at most the command currently on the wire.
+    Schedulers are shared per host through for_host().
+    With set_limits() the next command is also held back while the host exceeds
+    the given commands or reply bytes per second. Reply bytes are charged after
+    the reply arrived, reading slower would keep VDR busy with the command (LSTE
+    holds VDR's schedules lock while it writes). Interactive commands are never
+    held back but use up the budget as well.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, name=""):
+        self.name = name
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._busy = False
+        self._commands = None
+        self._bytes = None
+        # priority -> [commands, seconds waited, max seconds waited,
+        #              seconds held back by the limits, max seconds held back]
+        self.stats = {p: [0, 0.0, 0.0, 0.0, 0.0] for p in PRIORITY_NAMES}
+
+    @classmethod
+    def for_host(cls, hostname, port):
+        key = (hostname, port)
+        with cls._registry_lock:
+            scheduler = cls._registry.get(key)
+            if scheduler is None:
+                scheduler = cls._registry[key] = cls(f"{hostname}:{port}")
+            return scheduler
+
+    """
+    Limits the rate of commands and reply bytes sent to the host, None or 0
+    removes a limit. Applies to all clients of the host.
+    """
+
+    def set_limits(self, commands=None, reply_bytes=None, burst=1.0):
+        with self._cond:
+            self._commands = (
+                TokenBucket(commands, max(commands * burst, 1)) if commands else None
+            )
+            self._bytes = (
+                TokenBucket(reply_bytes, reply_bytes * burst) if reply_bytes else None
+            )
+            self._cond.notify_all()
+        _LOGGER.debug(
+            "Limits of %s: %s commands/s, %s bytes/s", self.name, commands, reply_bytes
+        )
+
+    def _limit_delay(self, priority):
+        if priority == PRIORITY_INTERACTIVE:
+            return 0.0
+        delay = 0.0
+        if self._commands is not None:
+            delay = self._commands.delay(1)
+        if self._bytes is not None:
+            delay = max(delay, self._bytes.delay(0))
+        return delay
+
+    def acquire(self, priority=PRIORITY_STATE):
+        entry = (priority, next(self._seq))
+        begin = time.monotonic()
+        limited = 0.0
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            # a waiter held back by the limits may have to let this one go first
+            self._cond.notify_all()
+            while True:
+                if self._busy or self._waiting[0] != entry:
+                    self._cond.wait()
+                    continue
+                delay = self._limit_delay(priority)
+                if delay <= 0:
+                    break
+                held = time.monotonic()
+                self._cond.wait(delay)
+                limited += time.monotonic() - held
+            heapq.heappop(self._waiting)
+            self._busy = True
+            if self._commands is not None:
+                self._commands.take(1)
+        waited = time.monotonic() - begin
+        stat = self.stats.setdefault(priority, [0, 0.0, 0.0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += waited
+        stat[2] = max(stat[2], waited)
+        stat[3] += limited
+        stat[4] = max(stat[4], limited)
+        return waited
+
+    def charge(self, size):
+        """Books the reply bytes of the command that holds the connection."""
+        if size and self._bytes is not None:
+            with self._cond:
+                self._bytes.take(size)
+
+    def release(self):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_STATE):
+        waited = self.acquire(priority)
+        if waited > 0.5:
+            _LOGGER.debug(
+                "%s command waited %.2fs for %s",
+                PRIORITY_NAMES.get(priority, priority),
+                waited,
+                self.name,
+            )
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pending(self):
+        with self._cond:
+            return len(self._waiting)
+
+    """
+    Wait statistics per priority class, wait includes the time held back by the
+    limits (limited).
+    :return dict name -> {"commands", "wait_total", "wait_max", "limited_total",
+                          "limited_max"}
+    """
+
+    def get_stats(self):
+        return {
+            PRIORITY_NAMES.get(p, str(p)): {
+                "commands": s[0],
+                "wait_total": round(s[1], 3),
+                "wait_max": round(s[2], 3),
+                "limited_total": round(s[3], 3),
+                "limited_max": round(s[4], 3),
+            }
+            for p, s in self.stats.items()
+        }
@@ -1,18 +1,47 @@
 #!/usr/bin/env python3
 
 from enum import Enum
-import re
+import codecs
 import socket
 import logging
+import threading
+import time
 from collections import namedtuple
 
+from .scheduler import CommandScheduler
+from .scheduler import command_priority
+from .trace import TRACE
+from .trace import TRACE_RECEIVED
+from .trace import TRACE_SENT
+
 
 SVDRP_CMD_LF = "\r\n"
 response_data = namedtuple("ResponseData", "Code Separator Value")
 SVDRP_EMPTY_RESPONSE = ""
+SVDRP_DEFAULT_ENCODING = "utf-8"
+SVDRP_RECV_SIZE = 65536
+# upper limit for a reply held in memory by send_cmd, and for a single line when streaming
+SVDRP_MAX_REPLY_SIZE = 32 * 1024 * 1024
+SVDRP_MAX_LINE_SIZE = 1024 * 1024
+# time budget in seconds for a whole exchange (connect, command, complete reply)
+SVDRP_COMMAND_DEADLINES = {
+    "LSTE": 120,
+    "LSTR": 60,
+    "LSTC": 30,
+    "LSTT": 15,
+    # epgsearch queries search the whole guide on the VDR
+    "PLUG": 30,
+    "CHAN": 3,
+    "STAT": 3,
+    "HITK": 3,
+    "VOLU": 3,
+}
+SVDRP_DEFAULT_DEADLINE = 10
 
 _LOGGER = logging.getLogger(__name__)
 
+_SPACE = (0x20, 0x09, 0x0B, 0x0C)
+
 
 class SVDRP_COMMANDS(str, Enum):
     QUIT = "quit"
@@ -24,6 +53,7 @@ class SVDRP_COMMANDS(str, Enum):
     LIST_EPG = "LSTE"
     CHANNEL_UP = "CHAN +"
     CHANNEL_DOWN = "CHAN -"
+    LIST_PLUGINS = "PLUG"
 
 
 class SVDRP_RESULT_CODE(str, Enum):
@@ -31,25 +61,212 @@ class SVDRP_RESULT_CODE(str, Enum):
     EPG_DATA_RECORD = "215"
 
 
+class ResponseLine(object):
+    """
+    A single reply line, kept as offsets into the receive buffer.
+    Code, Separator and Value are only decoded when accessed, the raw_* accessors
+    hand out memoryview slices without copying.
+    """
+
+    __slots__ = ("_buf", "_start", "_sep", "_sepend", "_val", "_end", "_encoding")
+
+    def __init__(self, buf, start, end, encoding=SVDRP_DEFAULT_ENCODING):
+        # <Reply code:3><-|Space><Text><Newline>
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._encoding = encoding
+
+        if end - start < 4 or not (
+            0x30 <= buf[start] <= 0x39
+            and 0x30 <= buf[start + 1] <= 0x39
+            and 0x30 <= buf[start + 2] <= 0x39
+        ):
+            # not a reply line at all, behaves like an empty "221" line
+            self._start = self._sep = self._sepend = self._val = self._end = -1
+            return
+
+        # first word is a number (channel, timer) or a single record letter (EPG)
+        pos = start + 4
+        tok = pos
+        while tok < end and 0x30 <= buf[tok] <= 0x39:
+            tok += 1
+        if tok == pos and tok < end and 0x41 <= (buf[tok] & 0xDF) <= 0x5A:
+            tok += 1
+        if tok > pos and (tok == end or buf[tok] in _SPACE):
+            self._sep = pos
+            self._sepend = tok
+            self._val = tok + 1 if tok < end else end
+            return
+        # anything else: separator is the char after the code
+        self._sep = start + 3
+        self._sepend = self._val = start + 4
+
+    def _decode(self, start, end):
+        if start >= end:
+            return ""
+        return str(self._buf[start:end], self._encoding, "replace")
+
+    @property
+    def Code(self):
+        if self._start < 0:
+            return "221"
+        return self._decode(self._start, self._start + 3)
+
+    @property
+    def Separator(self):
+        return self._decode(self._sep, self._sepend)
+
+    @property
+    def Value(self):
+        return self._decode(self._val, self._end)
+
+    @property
+    def code(self):
+        """Reply code as int, without decoding."""
+        if self._start < 0:
+            return 221
+        b = self._buf
+        s = self._start
+        return (b[s] - 0x30) * 100 + (b[s + 1] - 0x30) * 10 + b[s + 2] - 0x30
+
+    @property
+    def tag(self):
+        """First byte of the separator (EPG record letter) as int, 0 if empty."""
+        if self._sep >= self._sepend:
+            return 0
+        return self._buf[self._sep]
+
+    @property
+    def is_last(self):
+        """True for the final line of a reply (' ' instead of '-' after the code)."""
+        return self._start < 0 or self._buf[self._start + 3] != 0x2D
+
+    @property
+    def raw_separator(self):
+        return self._buf[self._sep : self._sepend]
+
+    @property
+    def raw_value(self):
+        return self._buf[self._val : self._end]
+
+    def decode(self, raw):
+        """Decodes a raw slice of this line with the character set of the server."""
+        return str(raw, self._encoding, "replace")
+
+    def astuple(self):
+        return response_data(
+            Code=self.Code, Separator=self.Separator, Value=self.Value
+        )
+
+    def __repr__(self):
+        return repr(self.astuple())
+
+
+def split_lines(buf, encoding=SVDRP_DEFAULT_ENCODING, start=0, end=None):
+    """
+    Splits a receive buffer (bytes or bytearray) into ResponseLine objects
+    without copying any bytes.
+    :return list of ResponseLine
+    """
+    if end is None:
+        end = len(buf)
+    find = buf.find
+    buf = memoryview(buf)
+    lines = []
+    pos = start
+    while pos < end:
+        nl = find(b"\n", pos, end)
+        if nl < 0:
+            nl = end
+        stop = nl
+        if stop > pos and buf[stop - 1] == 0x0D:
+            stop -= 1
+        if stop > pos:
+            lines.append(ResponseLine(buf, pos, stop, encoding))
+        pos = nl + 1
+    return lines
+
+
+def command_deadline(cmd, deadlines=None):
+    """
+    Looks up the time budget of a SVDRP command line by its verb,
+    deadlines overrides or extends SVDRP_COMMAND_DEADLINES.
+    :return seconds
+    """
+    parts = getattr(cmd, "value", cmd).split(None, 1)
+    verb = parts[0].upper() if parts else ""
+    if deadlines and verb in deadlines:
+        return deadlines[verb]
+    return SVDRP_COMMAND_DEADLINES.get(verb, SVDRP_DEFAULT_DEADLINE)
+
+
+def greeting_encoding(line, default=SVDRP_DEFAULT_ENCODING):
+    """
+    VDR announces its character set at the end of the greeting:
+    220 vdr SVDRP VideoDiskRecorder 2.6.1; Mon Oct 19 14:52:49 2026; UTF-8
+    :return codec name
+    """
+    if line is None or line.code != 220:
+        return default
+    raw = bytes(line.raw_value)
+    pos = raw.rfind(b";")
+    if pos < 0:
+        return default
+    charset = raw[pos + 1 :].strip().decode("ascii", "replace")
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return default
+
+
 class SVDRP(object):
     SVDRP_STATUS_OK = "250"
 
-    def __init__(self, hostname="localhost", port=6419, timeout=10):
+    def __init__(
+        self,
+        hostname="localhost",
+        port=6419,
+        timeout=10,
+        encoding=None,
+        scheduler=None,
+        max_reply_size=SVDRP_MAX_REPLY_SIZE,
+        deadlines=None,
+    ):
         self.hostname = hostname
         self.port = port
+        # bounds a single connect or receive, deadlines bound the whole command
         self.timeout = timeout
+        self.deadlines = deadlines
         self.socket = None
+        self.max_reply_size = max_reply_size
+        self.truncated = False
+        self.timed_out = False
+        self.cancelled = False
+        self._command = None
+        self._started = None
+        self._deadline = None
+        # reply bytes of the current exchange, charged to the scheduler's limits
+        self.received = 0
+        self._lock = threading.Lock()
+        # shared by all clients of the host unless given explicitly
+        self.scheduler = scheduler
         self.responses = []
+        # None: use the character set announced in the greeting
+        self.encoding = encoding
+        self.server_encoding = encoding or SVDRP_DEFAULT_ENCODING
 
     def _connect(self):
         if self.socket is None:
             try:
-                _LOGGER.debug("Setting up connection to {}".format(self.hostname))
+                _LOGGER.debug("Setting up connection to %s", self.hostname)
                 self.socket = socket.create_connection(
-                    (self.hostname, self.port), timeout=self.timeout
+                    (self.hostname, self.port), timeout=self._remaining()
                 )
+            except socket.timeout:
+                self._expired()
             except socket.error as se:
-                _LOGGER.info("Unable to connect. Not powered on? {}".format(se))
+                _LOGGER.info("Unable to connect. Not powered on? %s", se)
             finally:
                 self.responses = []
 
@@ -58,86 +275,307 @@ class SVDRP(object):
         if self.socket is not None:
             if send_quit:
                 self.socket.sendall(SVDRP_COMMANDS.QUIT.join(SVDRP_CMD_LF).encode())
-            self.socket.close()
-            self.socket = None
+            with self._lock:
+                self.socket.close()
+                self.socket = None
 
     def is_connected(self):
         return self.socket is not None
 
+    """
+    True if the reply of the latest command is incomplete because it was truncated,
+    ran out of time or was cancelled. Only complete lines are kept in that case.
+    """
+
+    @property
+    def partial(self):
+        return self.truncated or self.timed_out or self.cancelled
+
+    """
+    Aborts the command currently on the wire, from any thread. The waiting receive
+    returns at once and the command ends with the lines received so far.
+    :return True if a command was running
+    """
+
+    def cancel(self):
+        with self._lock:
+            sock = self.socket
+            if sock is None:
+                return False
+            self.cancelled = True
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        _LOGGER.debug("Cancelled %s on %s", self._command, self.hostname)
+        return True
+
+    def _start_deadline(self, cmd):
+        self.truncated = self.timed_out = self.cancelled = False
+        self.received = 0
+        if isinstance(cmd, (list, tuple)):
+            # a pipelined batch may take as long as its commands one by one
+            self._command = "{} commands".format(len(cmd))
+            budget = sum(command_deadline(c, self.deadlines) for c in cmd)
+        else:
+            self._command = getattr(cmd, "value", cmd)
+            budget = command_deadline(cmd, self.deadlines)
+        self._started = time.monotonic()
+        self._deadline = self._started + budget
+
+    def _remaining(self):
+        if self._deadline is None:
+            return self.timeout
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("deadline of {} exceeded".format(self._command))
+        return min(self.timeout, remaining) if self.timeout else remaining
+
+    def _arm(self):
+        # the next receive may only use what is left of the command's budget
+        self.socket.settimeout(self._remaining())
+
+    def _expired(self):
+        self.timed_out = True
+        _LOGGER.warning(
+            "%s: no complete reply to %s within %ss",
+            self.hostname,
+            self._command,
+            round(self._deadline - self._started, 1),
+        )
+
+    def get_scheduler(self):
+        if self.scheduler is None:
+            self.scheduler = CommandScheduler.for_host(self.hostname, self.port)
+        return self.scheduler
+
+    def _encode_cmd(self, cmd):
+        return (cmd + SVDRP_CMD_LF).encode(self.server_encoding, "replace")
+
+    def _send_with_quit(self, cmd):
+        cmds = cmd if isinstance(cmd, (list, tuple)) else (cmd,)
+        data = b"".join(self._encode_cmd(c) for c in cmds)
+        data += self._encode_cmd(SVDRP_COMMANDS.QUIT)
+        if TRACE.enabled:
+            TRACE.record(self.hostname, TRACE_SENT, data)
+        self.socket.sendall(data)
+
+    def _recv_all(self, max_size=None):
+        if max_size is None:
+            max_size = self.max_reply_size
+        buf = bytearray()
+        chunk = bytearray(SVDRP_RECV_SIZE)
+        view = memoryview(chunk)
+        recv_into = self.socket.recv_into
+        try:
+            while True:
+                self._arm()
+                n = recv_into(chunk)
+                if not n:
+                    break
+                self.received += n
+                buf += view[:n]
+                if max_size and len(buf) > max_size:
+                    _LOGGER.warning(
+                        "Reply from %s exceeds %d bytes, truncated",
+                        self.hostname,
+                        max_size,
+                    )
+                    self.truncated = True
+                    # keep complete lines only
+                    del buf[buf.rfind(b"\n") + 1 :]
+                    break
+        except socket.timeout:
+            self._expired()
+        except IOError as e:
+            _LOGGER.debug("IOError e %s, closing connection", e)
+        if self.timed_out or self.cancelled:
+            # keep complete lines only
+            del buf[buf.rfind(b"\n") + 1 :]
+        return buf
+
+    def _split_response(self, buf):
+        encoding = self.encoding
+        if encoding is None:
+            nl = buf.find(b"\n")
+            greeting = split_lines(buf, end=nl if nl >= 0 else len(buf))
+            encoding = greeting_encoding(greeting[0] if greeting else None)
+        self.server_encoding = encoding
+        return split_lines(buf, encoding)
+
     """
     Sends a SVDRP command to the VDR instance, by default the connection will be created and also be closed at the end.
     If the connection should be kept open in the end (e.g. for sending multi-commands)
     the param auto_disconnect needs to be set to False on invoking.
     The result will be stored in the internal responses array for later content handling.
+    The lines are slices of the receive buffer, text is only decoded on access.
+    Commands are queued by priority class (see scheduler.command_priority) with all
+    other clients of the same host, interactive commands go first.
+    Each command has a total time budget (see command_deadline), when it runs out
+    the lines received so far are kept and partial is set.
     :return void / nothing
     """
 
-    def send_cmd(self, cmd):
+    def send_cmd(self, cmd, priority=None, callback=None):
+        if callback is not None:
+            for line in self.iter_cmd(cmd, priority):
+                callback(line)
+            return
+        if priority is None:
+            priority = command_priority(cmd)
+        with self.get_scheduler().slot(priority):
+            self._send_cmd(cmd)
+
+    """
+    Sends a SVDRP command and yields the reply lines while they arrive.
+    The socket is only read when the consumer asks for the next line, so a slow
+    consumer throttles the transfer and at most one receive chunk plus the lines
+    not yet consumed are held in memory. Nothing is stored in responses.
+    The connection is released when the iterator is exhausted or closed.
+    :return iterator of ResponseLine
+    """
+
+    def iter_cmd(self, cmd, priority=None):
+        if priority is None:
+            priority = command_priority(cmd)
+        with self.get_scheduler().slot(priority):
+            self._start_deadline(cmd)
+            self._connect()
+            _LOGGER.debug("Stream command: %s", cmd)
+            if not self.is_connected():
+                return
+            try:
+                self._send_with_quit(cmd)
+                yield from self._iter_lines()
+            except socket.timeout:
+                self._expired()
+            except IOError as e:
+                _LOGGER.debug("IOError e %s, closing connection", e)
+            finally:
+                self._disconnect()
+                self.get_scheduler().charge(self.received)
+
+    def _iter_lines(self):
+        pending = bytearray()
+        chunk = bytearray(SVDRP_RECV_SIZE)
+        view = memoryview(chunk)
+        encoding = self.encoding
+        while True:
+            self._arm()
+            n = self.socket.recv_into(chunk)
+            if not n:
+                break
+            self.received += n
+            if TRACE.enabled:
+                TRACE.record(self.hostname, TRACE_RECEIVED, view[:n])
+            pending += view[:n]
+            last = pending.rfind(b"\n")
+            if last < 0:
+                if len(pending) > SVDRP_MAX_LINE_SIZE:
+                    _LOGGER.warning("Line from %s too long, aborted", self.hostname)
+                    self.truncated = True
+                    return
+                continue
+            # complete lines move into an immutable block the yielded lines refer to
+            block = bytes(pending[: last + 1])
+            del pending[: last + 1]
+            if encoding is None:
+                block_lines = split_lines(block)
+                encoding = greeting_encoding(block_lines[0] if block_lines else None)
+                self.server_encoding = encoding
+            yield from split_lines(block, encoding)
+        if pending and not self.cancelled:
+            yield from split_lines(bytes(pending), encoding or self.server_encoding)
+
+    """
+    Sends several SVDRP commands on one connection without waiting for the
+    replies in between (pipelined), e.g. a series of NEWT/DELT/MODT.
+    The batch is queued with the best priority class of its commands and has the
+    sum of their time budgets.
+    :return list with the reply lines of each command, None for commands without reply
+    """
+
+    def send_batch(self, cmds, priority=None):
+        cmds = [getattr(cmd, "value", cmd) for cmd in cmds]
+        if not cmds:
+            return []
+        if priority is None:
+            priority = min(command_priority(cmd) for cmd in cmds)
+        with self.get_scheduler().slot(priority):
+            buf = self._exchange(cmds)
+        replies = []
+        reply = []
+        for line in self._split_response(buf):
+            if line.code == 220 and not replies and not reply:
+                continue
+            reply.append(line)
+            if line.is_last:
+                replies.append(reply)
+                reply = []
+        del replies[len(cmds) :]
+        replies.extend([None] * (len(cmds) - len(replies)))
+        return replies
+
+    """
+    Sends a SVDRP command and returns the undecoded reply (greeting and quit included),
+    e.g. to hand it to another process. The encoding announced by VDR is in
+    server_encoding afterwards.
+    :return bytearray
+    """
+
+    def send_cmd_raw(self, cmd, priority=None, max_size=None):
+        if priority is None:
+            priority = command_priority(cmd)
+        with self.get_scheduler().slot(priority):
+            buf = self._exchange(cmd, max_size)
+        if self.encoding is None:
+            nl = buf.find(b"\n")
+            greeting = split_lines(buf, end=nl if nl >= 0 else len(buf))
+            self.server_encoding = greeting_encoding(greeting[0] if greeting else None)
+        return buf
+
+    def _exchange(self, cmd, max_size=None):
+        self._start_deadline(cmd)
         self._connect()
-        _LOGGER.debug("Send command: {}".format(cmd))
+        _LOGGER.debug("Send command: %s", cmd)
 
         if not self.is_connected():
-            return
-
-        command_list = [cmd]
-        command_list.extend([SVDRP_COMMANDS.QUIT])
-        _LOGGER.debug("Send commands: {}".format(command_list))
+            return bytearray()
 
         try:
-            data = list()
-            [self.socket.sendall(s.join(SVDRP_CMD_LF).encode()) for s in command_list]
-            while True:
-                data.append(self.socket.recv(16))
-                if not data[-1]:
-                    break
+            self._send_with_quit(cmd)
+            buf = self._recv_all(max_size)
+        except socket.timeout:
+            self._expired()
+            buf = bytearray()
         except IOError as e:
-            _LOGGER.debug("IOError e {}, closing connection".format(e))
+            _LOGGER.debug("IOError e %s, closing connection", e)
+            buf = bytearray()
         finally:
-            _LOGGER.debug("Decoding data into responses: %s" % data)
-            response_raw = b"".join(data)
-            [
-                self.responses.append(self._parse_response_item(s.decode()))
-                for s in response_raw.splitlines()
-            ]
-
             self._disconnect()
+            self.get_scheduler().charge(self.received)
+        if TRACE.enabled:
+            TRACE.record(self.hostname, TRACE_RECEIVED, buf)
+        return buf
+
+    def _send_cmd(self, cmd):
+        buf = self._exchange(cmd)
+        _LOGGER.debug("Decoding %d bytes into responses", len(buf))
+        self.responses = self._split_response(buf)
 
     """
     Parses a single response item into data set
-    :return response_data object
+    :return ResponseLine object
     """
 
     def _parse_response_item(self, resp):
-        # <Reply code:3><-|Space><Text><Newline>
-        # print ("---",resp)
-        match_obj = re.match(r"^(\d{3})[\-|\s]([0-9]+|[A-Z])\s(.*)$", resp, re.M | re.I)
-        if not match_obj:
-            match_obj = re.match(r"^(\d{3})[\-|\s]([0-9]+|[A-Z])()$", resp, re.M | re.I)
-        if not match_obj:
-            match_obj = re.match(r"^(\d{3})(.)(.*)", resp, re.M | re.I)
-        if match_obj:
-            return response_data(
-                Code=match_obj.group(1),
-                Separator=match_obj.group(2),
-                Value=match_obj.group(3),
-            )
-        else:
-            return response_data(Code="221", Separator="", Value="")
-
-    """
-    Gets the response from the last CMD and puts it in the internal list.
-    :return Namedtuple (Code, Separator, Value)
-    """
-
-    def _read_response_(self):
-        for line in self.responses:
-            response_entry = self._parse_response_item(line)
-            self.responses.append(response_entry)
-
-            # The first and last row are separated simply by ' ', other with '-'.
-            # End once found a ' ' separator
-            if response_entry.Separator != "-" and len(self.responses) > 1:
-                break
+        if isinstance(resp, str):
+            resp = resp.encode(self.server_encoding, "replace")
+        lines = split_lines(resp, self.server_encoding)
+        if not lines:
+            # no reply line, the same empty "221" line ResponseLine makes of garbage
+            return ResponseLine(b"", 0, 0, self.server_encoding)
+        return lines[0]
 
     """
     Gets the response of the latest CMD as plaintext
@@ -151,7 +589,7 @@ class SVDRP(object):
     Gets the response of the latest CMD as data structure
     By default returns a list, if single line set to true it will just return the
     1st state line.
-    :return List of Namedtuple (Code, Separator, Value)
+    :return List of ResponseLine (Code, Separator, Value)
     """
 
     def get_response(self, single_line=False):
@@ -162,5 +600,5 @@ class SVDRP(object):
             _LOGGER.debug("Returning single item")
             return self.responses[2]
         else:
-            _LOGGER.debug("Returning {} items".format(len(self.responses)))
+            _LOGGER.debug("Returning %d items", len(self.responses))
             return self.responses
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import collections
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+TRACE_SENT = ">"
+TRACE_RECEIVED = "<"
+TRACE_DEFAULT_SIZE = 4 * 1024 * 1024
+
+
+class SvdrpTrace(object):
+    """
+    Ring buffer of raw SVDRP exchanges (commands sent, reply bytes received).
+    While disabled, clients only test `enabled` and nothing is formatted or copied.
+    The oldest records are dropped once max_size bytes are held.
+    """
+
+    def __init__(self, max_size=TRACE_DEFAULT_SIZE):
+        self.enabled = False
+        self.max_size = max_size
+        self._records = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def enable(self, max_size=None):
+        if max_size:
+            self.max_size = max_size
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._size = 0
+
+    def record(self, host, direction, data):
+        data = bytes(data)
+        with self._lock:
+            self._records.append((time.time(), host, direction, data))
+            self._size += len(data)
+            while self._size > self.max_size and self._records:
+                self._size -= len(self._records.popleft()[3])
+
+    def __len__(self):
+        return len(self._records)
+
+    def size(self):
+        return self._size
+
+    """
+    Writes the buffered exchanges as text, one block per record.
+    :return number of records written
+    """
+
+    def dump(self, path):
+        with self._lock:
+            records = list(self._records)
+        with open(path, "w", encoding="utf-8") as out:
+            for at, host, direction, data in records:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at))
+                out.write(
+                    "{}.{:03d} {} {} {} bytes\n".format(
+                        stamp, int(at * 1000) % 1000, host, direction, len(data)
+                    )
+                )
+                out.write(data.decode("utf-8", "backslashreplace"))
+                if not data.endswith(b"\n"):
+                    out.write("\n")
+        _LOGGER.debug("Dumped %d SVDRP trace records to %s", len(records), path)
+        return len(records)
+
+
+# shared by all SVDRP clients of the process
+TRACE = SvdrpTrace()
@@ -0,0 +1,108 @@
+"""Websocket API of the VDR integration: EPG and timer snapshots followed by deltas."""
+import logging
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .services import DOMAIN
+from .tgpyvdr.epgcodec import encode_channels
+from .tgpyvdr.epgcodec import pack
+
+_LOGGER = logging.getLogger(__name__)
+
+WS_TYPE_SUBSCRIBE = f"{DOMAIN}/subscribe"
+
+SIGNAL_DELTA = DOMAIN + "_delta_{}"
+
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"
+
+
+def signal_delta(name):
+    return SIGNAL_DELTA.format(name)
+
+
+def _snapshot(vdr, channels, format=FORMAT_JSON):
+    store = vdr["epg_store"]
+    payloads = {
+        channelid: store.channel_payload(channelid)
+        for channelid in list(store.channels)
+        if channels is None or channelid in channels
+    }
+    snapshot = {"type": "snapshot", "timers": vdr.get("timers") or []}
+    if format == FORMAT_COMPACT:
+        # one string table for all channels, zlib compressed (see tgpyvdr/epgcodec.py)
+        snapshot["format"] = FORMAT_COMPACT
+        snapshot["epg"] = pack(encode_channels(payloads), compress=True)
+    else:
+        snapshot["channels"] = payloads
+    return snapshot
+
+
+def _filter_delta(delta, channels):
+    if channels is None or delta.get("type") != "epg":
+        return delta
+    selected = {
+        channelid: change
+        for channelid, change in delta["channels"].items()
+        if channelid in channels
+    }
+    if not selected:
+        return None
+    return {"type": "epg", "channels": selected}
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_SUBSCRIBE,
+        vol.Optional("vdr"): str,
+        vol.Optional("channels"): [str],
+        vol.Optional("format", default=FORMAT_JSON): vol.In(
+            [FORMAT_JSON, FORMAT_COMPACT]
+        ),
+    }
+)
+@websocket_api.async_response
+async def websocket_subscribe(hass, connection, msg):
+    """Send a snapshot of EPG and timers, then only what changed."""
+    vdrs = hass.data.get(DOMAIN, {})
+    name = msg.get("vdr") or next(iter(vdrs), None)
+    vdr = vdrs.get(name)
+    if vdr is None:
+        connection.send_error(msg["id"], "not_found", "VDR not configured")
+        return
+    channels = set(msg["channels"]) if "channels" in msg else None
+    # deltas arriving while the snapshot is built follow it, applying them again is harmless
+    queued = []
+
+    @callback
+    def forward_delta(delta):
+        delta = _filter_delta(delta, channels)
+        if delta is None:
+            return
+        if queued is not None:
+            queued.append(delta)
+        else:
+            connection.send_message(websocket_api.event_message(msg["id"], delta))
+
+    connection.subscriptions[msg["id"]] = async_dispatcher_connect(
+        hass, signal_delta(name), forward_delta
+    )
+    connection.send_result(msg["id"])
+    # serializing (and compressing) the whole guide takes too long for the event loop
+    snapshot = await hass.async_add_executor_job(
+        _snapshot, vdr, channels, msg["format"]
+    )
+    connection.send_message(websocket_api.event_message(msg["id"], snapshot))
+    pending, queued = queued, None
+    for delta in pending:
+        connection.send_message(websocket_api.event_message(msg["id"], delta))
+
+
+@callback
+def async_setup_websocket(hass):
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_subscribe)